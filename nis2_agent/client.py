@@ -1,9 +1,66 @@
 from __future__ import annotations
 
+import gzip
+import json
 import logging
+import threading
+from pathlib import Path
 from typing import Any, Dict, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from nis2_agent.json_utils import dumps
+
+
+def _build_session() -> requests.Session:
+    """
+    Jedna współdzielona sesja HTTP dla całego procesu agenta:
+    keep-alive + pula połączeń (bez ponownego TCP/TLS handshake przy
+    każdym wywołaniu) oraz retry na przejściowe błędy bramki.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=[502, 503, 504],
+        ),
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(
+        {
+            "User-Agent": "nis2-agent",
+            "Accept": "application/json",
+        }
+    )
+    return session
+
+
+_SESSION = _build_session()
+
+BUNDLE_CACHE_FILE = "rules_bundle.cache.json"
+
+
+def prewarm_connection(server_url: str, timeout: float = 2.0) -> None:
+    """
+    W tle (wątek daemon) wysyła HEAD /health, żeby zestawić połączenie
+    TCP/TLS w puli sesji, zanim skończy się skan i trzeba będzie wysłać raport.
+    Błędy są ignorowane – to tylko optymalizacja.
+    """
+    url = server_url.rstrip("/") + "/health"
+
+    def _head() -> None:
+        try:
+            _SESSION.head(url, timeout=timeout)
+        except Exception:
+            pass
+
+    threading.Thread(target=_head, name="nis2-prewarm", daemon=True).start()
 
 
 def send_report(
@@ -24,9 +81,18 @@ def send_report(
     """
     url = server_url.rstrip("/") + "/api/v1/reports"
 
+    body = dumps(payload)
+    headers = {"Content-Type": "application/json"}
+    # Powtarzalne klucze JSON kompresują się bardzo dobrze; wysyłamy gzip
+    # tylko wtedy, gdy faktycznie daje to zauważalną oszczędność.
+    compressed = gzip.compress(body, compresslevel=6)
+    if len(compressed) < len(body) * 0.9:
+        body = compressed
+        headers["Content-Encoding"] = "gzip"
+
     try:
-        logger.info("Sending report to %s ...", url)
-        resp = requests.post(url, json=payload, timeout=timeout)
+        logger.info("Sending report to %s (%d bytes) ...", url, len(body))
+        resp = _SESSION.post(url, data=body, headers=headers, timeout=timeout)
     except Exception as e:
         logger.error("Error while sending report to server: %s", e)
         return None
@@ -66,7 +132,7 @@ def fetch_config(
     url = server_url.rstrip("/") + f"/api/v1/agents/{agent_id}/config"
     try:
         logger.info("Fetching config from %s ...", url)
-        resp = requests.get(url, timeout=timeout)
+        resp = _SESSION.get(url, timeout=timeout)
     except Exception as e:
         logger.error("Error while fetching config: %s", e)
         return None
@@ -93,7 +159,33 @@ def fetch_config(
     return data
 
 
-def fetch_rules_bundle(server_url: str) -> Dict[str, Any]:
+def _load_bundle_cache(cache_path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with cache_path.open("r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict) or not cached.get("etag"):
+        return None
+    if not isinstance(cached.get("bundle"), dict):
+        return None
+    return cached
+
+
+def _save_bundle_cache(cache_path: Path, etag: str, bundle: Dict[str, Any]) -> None:
+    try:
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with cache_path.open("w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "bundle": bundle}, f, ensure_ascii=False)
+    except OSError:
+        # Cache jest tylko optymalizacją – brak zapisu nie jest błędem
+        pass
+
+
+def fetch_rules_bundle(
+    server_url: str,
+    cache_dir: Optional[str] = None,
+) -> Dict[str, Any]:
     """
     Pobiera z serwera komplet reguł dla agenta z endpointu /api/v1/rules/bundle.
     Oczekuje struktury:
@@ -101,9 +193,24 @@ def fetch_rules_bundle(server_url: str) -> Dict[str, Any]:
         "version": "<hash>",
         "rules": [ {...}, ... ]
       }
+    Jeśli podano cache_dir, bundle jest cache'owany w
+    <cache_dir>/rules_bundle.cache.json razem z ETagiem, a kolejne
+    pobrania są warunkowe (If-None-Match) – przy 304 zwracany jest cache.
     """
     url = server_url.rstrip("/") + "/api/v1/rules/bundle"
-    resp = requests.get(url, timeout=10)
+
+    cache_path = Path(cache_dir) / BUNDLE_CACHE_FILE if cache_dir else None
+    cached = _load_bundle_cache(cache_path) if cache_path else None
+
+    headers = {"If-None-Match": cached["etag"]} if cached else None
+    resp = _SESSION.get(url, headers=headers, timeout=10)
+    if resp.status_code == 304 and cached:
+        return cached["bundle"]
+
     resp.raise_for_status()
     data: Dict[str, Any] = resp.json()
-    return data
\ No newline at end of file
+
+    etag = resp.headers.get("ETag")
+    if cache_path and etag:
+        _save_bundle_cache(cache_path, etag, data)
+    return data
@@ -0,0 +1,25 @@
+from __future__ import annotations
+
+import json
+from typing import Any
+
+try:
+    # orjson (C/Rust) – kilkukrotnie szybsze kodowanie dużych słowników skanu
+    import orjson
+except ImportError:  # opcjonalna zależność
+    orjson = None
+
+
+def dumps(obj: Any, indent: bool = False) -> bytes:
+    """
+    Koduje obiekt do JSON (UTF-8, bez escapowania znaków spoza ASCII).
+    Używa orjson, jeśli jest zainstalowany, w przeciwnym razie stdlib json.
+    indent=True daje wcięcia 2 spacje (pliki do czytania przez człowieka).
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    if indent:
+        text = json.dumps(obj, indent=2, ensure_ascii=False)
+    else:
+        text = json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+    return text.encode("utf-8")
@@ -2,16 +2,24 @@ from __future__ import annotations
 
 import argparse
 import datetime as dt
-import json
+import logging
+import os
 import socket
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict
 
+from nis2_agent.json_utils import dumps
 from nis2_agent.logging_config import setup_logging
 from nis2_agent.scanner import scan_system
 from nis2_agent.rules_engine import RulesEngine
-from nis2_agent.client import send_report, fetch_config, fetch_rules_bundle
+from nis2_agent.client import (
+    send_report,
+    fetch_config,
+    fetch_rules_bundle,
+    prewarm_connection,
+)
 
 
 DEFAULT_INTERVAL_SECONDS = 6 * 60 * 60  # 6h
@@ -22,8 +30,11 @@ def save_json(data: Dict[str, Any], directory: str, prefix: str) -> Path:
     path.mkdir(parents=True, exist_ok=True)
     ts = dt.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
     file_path = path / f"{prefix}_{ts}.json"
-    with file_path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    # Jedno kodowanie do bajtów i jeden zapis; tmp + os.replace = zapis atomowy
+    payload = dumps(data, indent=True)
+    tmp_path = file_path.with_suffix(file_path.suffix + ".tmp")
+    tmp_path.write_bytes(payload)
+    os.replace(tmp_path, file_path)
     return file_path
 
 
@@ -32,11 +43,20 @@ def build_rules_engine(
     rules_source: str,
     rules_dir: str,
     server_url: str | None,
+    cache_dir: str | None = None,
+    current: RulesEngine | None = None,
+    prefetched_bundle: Future | None = None,
 ) -> RulesEngine:
     """
     Buduje RulesEngine w zależności od źródła reguł:
     - local: YAML z katalogu rules_dir
     - remote: bundle z nis2_server (/api/v1/rules/bundle), z fallbackiem na lokalne pliki
+
+    Jeśli przekazano `current` i wersja bundla z serwera się nie zmieniła
+    (albo – dla reguł lokalnych – pliki YAML nie zmieniły się od
+    ostatniego ładowania), zwracany jest ten sam silnik.
+    `prefetched_bundle` to Future z fetch_rules_bundle uruchomionym
+    wcześniej w tle (tryb 'loop'); błędy obsługiwane są jak przy pobraniu.
     """
     if rules_source == "remote":
         if not server_url:
@@ -45,15 +65,25 @@ def build_rules_engine(
             )
         else:
             try:
-                bundle = fetch_rules_bundle(server_url)
+                if prefetched_bundle is not None:
+                    bundle = prefetched_bundle.result()
+                else:
+                    bundle = fetch_rules_bundle(server_url, cache_dir=cache_dir)
                 rules = bundle.get("rules") or []
                 version = bundle.get("version")
+                if (
+                    current is not None
+                    and version is not None
+                    and current.version == version
+                ):
+                    logger.info("Rules bundle unchanged (version=%s)", version)
+                    return current
                 logger.info(
                     "Loaded %d rules from server (version=%s)",
                     len(rules),
                     version,
                 )
-                return RulesEngine.from_list(rules)
+                return RulesEngine.from_list(rules, version=version)
             except Exception as e:
                 logger.error(
                     "Failed to fetch rules bundle from server (%s). "
@@ -62,6 +92,20 @@ def build_rules_engine(
                     rules_dir,
                 )
 
+    if (
+        current is not None
+        and current.version is None
+        and current.rules_dir == Path(rules_dir)
+    ):
+        # Ten sam katalog – przeładuj tylko, jeśli pliki się zmieniły
+        if current.maybe_reload():
+            logger.info(
+                "Reloaded %d rules from local directory %s",
+                len(current.rules),
+                rules_dir,
+            )
+        return current
+
     engine = RulesEngine(rules_dir=rules_dir)
     logger.info(
         "Loaded %d rules from local directory %s",
@@ -78,9 +122,20 @@ def run_single_scan(
     log_dir: str,
     server_url: str | None,
     agent_id: str,
-) -> None:
+    engine: RulesEngine | None = None,
+    prefetched_bundle: Future | None = None,
+) -> RulesEngine:
+    """
+    Wykonuje pojedynczy skan + ocenę reguł (+ opcjonalną wysyłkę raportu).
+    Zwraca użyty RulesEngine, żeby tryb 'loop' mógł go przekazać
+    do kolejnej iteracji.
+    """
     logger.info("Starting scan...")
 
+    if server_url:
+        # Handshake z serwerem w tle, równolegle ze skanem
+        prewarm_connection(server_url)
+
     scan_result = scan_system()
     scan_dict = scan_result.to_dict()
 
@@ -92,6 +147,9 @@ def run_single_scan(
         rules_source=rules_source,
         rules_dir=rules_dir,
         server_url=server_url,
+        cache_dir=log_dir,
+        current=engine,
+        prefetched_bundle=prefetched_bundle,
     )
     logger.info("Rules engine initialized with %d rules", len(engine.rules))
 
@@ -106,17 +164,23 @@ def run_single_scan(
     )
     logger.info("Rule results saved to %s", results_file)
 
-    # Dodatkowy log w formie JSONL dla findings
+    # Dodatkowy log w formie JSONL dla findings + podsumowanie – jeden przebieg
+    log_failed = logger.isEnabledFor(logging.INFO)
+    failed = 0
+    failed_lines = []
     jsonl_path = Path(log_dir) / "findings.jsonl"
-    with jsonl_path.open("a", encoding="utf-8") as f:
-        for r in rule_results:
+    with jsonl_path.open("ab", buffering=1 << 16) as f:
+        for r, ser in zip(rule_results, results_serialized):
             if not r.passed:
-                json.dump(engine.serialize_result(r), f, ensure_ascii=False)
-                f.write("\n")
+                failed += 1
+                f.write(dumps(ser) + b"\n")
+                if log_failed:
+                    failed_lines.append(
+                        f"- {r.rule_id} ({r.severity.upper()}): {r.description}"
+                    )
 
     # Podsumowanie lokalne
     total = len(rule_results)
-    failed = sum(1 for r in rule_results if not r.passed)
     passed = total - failed
 
     logger.info(
@@ -126,16 +190,9 @@ def run_single_scan(
         failed,
     )
 
-    if failed:
-        logger.info("Failed rules:")
-        for r in rule_results:
-            if not r.passed:
-                logger.info(
-                    "- %s (%s): %s",
-                    r.rule_id,
-                    r.severity.upper(),
-                    r.description,
-                )
+    if failed_lines:
+        # Jeden rekord logu zamiast osobnego wpisu na każdą regułę
+        logger.info("Failed rules:\n%s", "\n".join(failed_lines))
 
     # Wysyłka do serwera (jeśli skonfigurowany)
     if server_url:
@@ -157,6 +214,24 @@ def run_single_scan(
                 resp.get("timestamp"),
             )
 
+    return engine
+
+
+def _discard_future(logger: logging.Logger, future: Future) -> None:
+    """
+    Porzuca niepotrzebne pobranie w tle: anuluje je, a jeśli już trwa,
+    po zakończeniu loguje ewentualny błąd zamiast go zgubić.
+    """
+    if future.cancel():
+        return
+
+    def _log_error(done: Future) -> None:
+        exc = done.exception()
+        if exc is not None:
+            logger.warning("Discarded background rules bundle fetch failed: %s", exc)
+
+    future.add_done_callback(_log_error)
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(
@@ -230,9 +305,22 @@ def main() -> None:
 
     # Tryb 'loop'
     interval = DEFAULT_INTERVAL_SECONDS
+    engine: RulesEngine | None = None
+
+    # Pula do równoległego pobierania bundla reguł razem z configiem
+    pool = ThreadPoolExecutor(max_workers=1)
 
     try:
         while True:
+            # 0. Bundle reguł pobierany w tle – równolegle z configiem i skanem
+            bundle_future = None
+            if args.server_url and args.rules_source == "remote":
+                bundle_future = pool.submit(
+                    fetch_rules_bundle,
+                    args.server_url,
+                    cache_dir=args.log_dir,
+                )
+
             # 1. Opcjonalnie pobierz config z serwera (jeśli jest URL)
             if args.server_url:
                 cfg = fetch_config(
@@ -250,17 +338,21 @@ def main() -> None:
                             "Agent disabled by config. Sleeping for %s seconds.",
                             interval,
                         )
+                        if bundle_future is not None:
+                            _discard_future(logger, bundle_future)
                         time.sleep(max(interval, 60))
                         continue
 
             # 2. Wykonaj skan
-            run_single_scan(
+            engine = run_single_scan(
                 logger=logger,
                 rules_source=args.rules_source,
                 rules_dir=args.rules_dir,
                 log_dir=args.log_dir,
                 server_url=args.server_url,
                 agent_id=agent_id,
+                engine=engine,
+                prefetched_bundle=bundle_future,
             )
 
             # 3. Poczekaj do kolejnego skanu
@@ -269,6 +361,8 @@ def main() -> None:
 
     except KeyboardInterrupt:
         logger.info("Agent interrupted, exiting.")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
 
 
 if __name__ == "__main__":
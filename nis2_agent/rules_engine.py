@@ -1,14 +1,226 @@
 from __future__ import annotations
 
+import ast
 import datetime as dt
-from dataclasses import dataclass
+import operator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, FrozenSet, List, Optional
 
 import yaml
 import os
 
-@dataclass
+try:
+    # Parser C (libyaml) – kilkukrotnie szybszy od czystego Pythona
+    from yaml import CSafeLoader as _LOADER
+except ImportError:  # pyyaml zbudowany bez libyaml
+    from yaml import SafeLoader as _LOADER
+
+# ---
+# Bezpieczny ewaluator warunków reguł (podzbiór wyrażeń Pythona)
+# ---
+
+# Atrybuty niedozwolone poza nazwami zaczynającymi się od "_":
+# str.format / format_map pozwalają sięgać do atrybutów przez "{0.__class__}"
+_FORBIDDEN_ATTRS = frozenset({"format", "format_map"})
+
+_BIN_OPS: Dict[type, Callable[[Any, Any], Any]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+}
+
+_UNARY_OPS: Dict[type, Callable[[Any], Any]] = {
+    ast.Not: operator.not_,
+    ast.USub: operator.neg,
+    ast.UAdd: operator.pos,
+}
+
+_CMP_OPS: Dict[type, Callable[[Any, Any], bool]] = {
+    ast.Eq: operator.eq,
+    ast.NotEq: operator.ne,
+    ast.Lt: operator.lt,
+    ast.LtE: operator.le,
+    ast.Gt: operator.gt,
+    ast.GtE: operator.ge,
+    ast.Is: operator.is_,
+    ast.IsNot: operator.is_not,
+    ast.In: lambda a, b: a in b,
+    ast.NotIn: lambda a, b: a not in b,
+}
+
+# Węzły AST dopuszczalne w warunku (poza operatorami z map powyżej)
+_ALLOWED_NODES = frozenset(
+    {
+        ast.Expression,
+        ast.BoolOp,
+        ast.And,
+        ast.Or,
+        ast.UnaryOp,
+        ast.BinOp,
+        ast.Compare,
+        ast.IfExp,
+        ast.Call,
+        ast.keyword,
+        ast.Attribute,
+        ast.Subscript,
+        ast.Slice,
+        ast.Name,
+        ast.Load,
+        ast.Constant,
+        ast.Tuple,
+        ast.List,
+        ast.Set,
+        ast.Dict,
+    }
+    | _BIN_OPS.keys()
+    | _UNARY_OPS.keys()
+    | _CMP_OPS.keys()
+)
+
+
+def _compile_condition(condition: str) -> tuple[ast.expr, FrozenSet[str]]:
+    """
+    Parsuje warunek reguły do AST i sprawdza, że używa wyłącznie
+    dozwolonych konstrukcji. Zwraca (korzeń wyrażenia, nazwy top-level).
+    Rzuca SyntaxError / ValueError dla niepoprawnych warunków.
+    """
+    tree = ast.parse(condition.strip(), mode="eval")
+    names = set()
+    for node in ast.walk(tree):
+        if type(node) not in _ALLOWED_NODES:
+            raise ValueError(f"unsupported expression: {type(node).__name__}")
+        if isinstance(node, ast.Attribute) and (
+            node.attr.startswith("_") or node.attr in _FORBIDDEN_ATTRS
+        ):
+            raise ValueError(f"forbidden attribute: {node.attr}")
+        if isinstance(node, ast.keyword) and node.arg is None:
+            raise ValueError("unsupported expression: **kwargs")
+        if isinstance(node, ast.Dict) and None in node.keys:
+            raise ValueError("unsupported expression: **dict")
+        if isinstance(node, ast.Name):
+            names.add(node.id)
+    return tree.body, frozenset(names)
+
+
+def _eval_name(node: ast.Name, ctx: Dict[str, Any]) -> Any:
+    try:
+        return ctx[node.id]
+    except KeyError:
+        raise NameError(f"name {node.id!r} is not defined") from None
+
+
+def _eval_constant(node: ast.Constant, ctx: Dict[str, Any]) -> Any:
+    return node.value
+
+
+def _eval_bool_op(node: ast.BoolOp, ctx: Dict[str, Any]) -> Any:
+    is_and = isinstance(node.op, ast.And)
+    value = None
+    for sub in node.values:
+        value = _eval_node(sub, ctx)
+        if is_and != bool(value):
+            return value
+    return value
+
+
+def _eval_unary_op(node: ast.UnaryOp, ctx: Dict[str, Any]) -> Any:
+    return _UNARY_OPS[type(node.op)](_eval_node(node.operand, ctx))
+
+
+def _eval_bin_op(node: ast.BinOp, ctx: Dict[str, Any]) -> Any:
+    return _BIN_OPS[type(node.op)](
+        _eval_node(node.left, ctx),
+        _eval_node(node.right, ctx),
+    )
+
+
+def _eval_compare(node: ast.Compare, ctx: Dict[str, Any]) -> Any:
+    left = _eval_node(node.left, ctx)
+    for op, comparator in zip(node.ops, node.comparators):
+        right = _eval_node(comparator, ctx)
+        if not _CMP_OPS[type(op)](left, right):
+            return False
+        left = right
+    return True
+
+
+def _eval_if_exp(node: ast.IfExp, ctx: Dict[str, Any]) -> Any:
+    if _eval_node(node.test, ctx):
+        return _eval_node(node.body, ctx)
+    return _eval_node(node.orelse, ctx)
+
+
+def _eval_call(node: ast.Call, ctx: Dict[str, Any]) -> Any:
+    func = _eval_node(node.func, ctx)
+    args = [_eval_node(a, ctx) for a in node.args]
+    kwargs = {kw.arg: _eval_node(kw.value, ctx) for kw in node.keywords}
+    return func(*args, **kwargs)
+
+
+def _eval_attribute(node: ast.Attribute, ctx: Dict[str, Any]) -> Any:
+    return getattr(_eval_node(node.value, ctx), node.attr)
+
+
+def _eval_subscript(node: ast.Subscript, ctx: Dict[str, Any]) -> Any:
+    return _eval_node(node.value, ctx)[_eval_node(node.slice, ctx)]
+
+
+def _eval_slice(node: ast.Slice, ctx: Dict[str, Any]) -> Any:
+    return slice(
+        _eval_node(node.lower, ctx) if node.lower else None,
+        _eval_node(node.upper, ctx) if node.upper else None,
+        _eval_node(node.step, ctx) if node.step else None,
+    )
+
+
+def _eval_tuple(node: ast.Tuple, ctx: Dict[str, Any]) -> Any:
+    return tuple(_eval_node(e, ctx) for e in node.elts)
+
+
+def _eval_list(node: ast.List, ctx: Dict[str, Any]) -> Any:
+    return [_eval_node(e, ctx) for e in node.elts]
+
+
+def _eval_set(node: ast.Set, ctx: Dict[str, Any]) -> Any:
+    return {_eval_node(e, ctx) for e in node.elts}
+
+
+def _eval_dict(node: ast.Dict, ctx: Dict[str, Any]) -> Any:
+    return {
+        _eval_node(k, ctx): _eval_node(v, ctx)
+        for k, v in zip(node.keys, node.values)
+    }
+
+
+_EVAL_HANDLERS: Dict[type, Callable[[Any, Dict[str, Any]], Any]] = {
+    ast.Name: _eval_name,
+    ast.Constant: _eval_constant,
+    ast.BoolOp: _eval_bool_op,
+    ast.UnaryOp: _eval_unary_op,
+    ast.BinOp: _eval_bin_op,
+    ast.Compare: _eval_compare,
+    ast.IfExp: _eval_if_exp,
+    ast.Call: _eval_call,
+    ast.Attribute: _eval_attribute,
+    ast.Subscript: _eval_subscript,
+    ast.Slice: _eval_slice,
+    ast.Tuple: _eval_tuple,
+    ast.List: _eval_list,
+    ast.Set: _eval_set,
+    ast.Dict: _eval_dict,
+}
+
+
+def _eval_node(node: ast.AST, ctx: Dict[str, Any]) -> Any:
+    return _EVAL_HANDLERS[type(node)](node, ctx)
+
+
+@dataclass(slots=True)
 class Rule:
     id: str
     description: str
@@ -16,9 +228,47 @@ class Rule:
     condition: str
     tags: List[str]
     frameworks: List[str]
+    # Warunek sparsowany raz przy ładowaniu reguły
+    ast_root: Optional[ast.expr] = None
+    # Nazwy top-level (np. "ssh", "network"), do których odwołuje się warunek
+    referenced_keys: FrozenSet[str] = field(default_factory=frozenset)
+    # Błąd parsowania warunku (reguła zawsze FAIL z tym opisem)
+    error: Optional[str] = None
+
 
+def _rule_from_item(item: Dict[str, Any]) -> Rule:
+    """
+    Buduje Rule ze słownika (YAML / bundle) i od razu parsuje warunek.
+    """
+    rule = Rule(
+        id=item["id"],
+        description=item.get("description", ""),
+        severity=item.get("severity", "low"),
+        condition=item["condition"],
+        tags=item.get("tags", []),
+        frameworks=item.get("frameworks", []),
+    )
+    try:
+        rule.ast_root, rule.referenced_keys = _compile_condition(rule.condition)
+    except (SyntaxError, ValueError) as e:
+        rule.error = f"Rule compile error: {e}"
+    return rule
 
-@dataclass
+
+def _parse_rules_file(path: Path) -> List[Dict[str, Any]]:
+    """
+    Wczytuje i parsuje jeden plik YAML z regułami.
+    Zwraca listę słowników reguł (pustą, jeśli plik nie zawiera listy).
+    """
+    # Cały plik jako jeden str – bez readline() po stronie PyYAML
+    text = path.read_text(encoding="utf-8")
+    data = yaml.load(text, Loader=_LOADER) or []
+    if not isinstance(data, list):
+        return []
+    return data
+
+
+@dataclass(slots=True)
 class RuleResult:
     rule_id: str
     passed: bool
@@ -34,26 +284,26 @@ class RulesEngine:
     def __init__(self, rules_dir: str = "rules") -> None:
         self.rules_dir = Path(rules_dir)
         self.rules: List[Rule] = []
+        # Wersja bundla z serwera (None dla reguł lokalnych)
+        self.version: Optional[str] = None
+        # (liczba plików, max mtime_ns) katalogu reguł z ostatniego ładowania
+        self._files_signature: Optional[tuple[int, int]] = None
         self._load_rules()
 
     @classmethod
-    def from_list(cls, items: List[Dict[str, Any]]) -> "RulesEngine":
+    def from_list(
+        cls,
+        items: List[Dict[str, Any]],
+        version: Optional[str] = None,
+    ) -> "RulesEngine":
         """
         Tworzy RulesEngine z listy słowników (np. z /api/v1/rules/bundle).
         """
         self = cls(rules_dir=".")
         self.rules = []
+        self.version = version
         for item in items:
-            self.rules.append(
-                Rule(
-                    id=item["id"],
-                    description=item.get("description", ""),
-                    severity=item.get("severity", "low"),
-                    condition=item["condition"],
-                    tags=item.get("tags", []),
-                    frameworks=item.get("frameworks", []),
-                )
-            )
+            self.rules.append(_rule_from_item(item))
         return self
 
     def load_from_files(self) -> None:
@@ -61,78 +311,95 @@ class RulesEngine:
         Jawne przeładowanie reguł z katalogu (nie jest wymagane, bo __init__ woła _load_rules()).
         """
         self.rules = []
-        if not self.rules_dir.exists():
-            return
-        for path in sorted(self.rules_dir.glob("*.yml")):
-            with path.open("r", encoding="utf-8") as f:
-                data = yaml.safe_load(f) or []
-            if not isinstance(data, list):
-                continue
-            for item in data:
-                self.rules.append(
-                    Rule(
-                        id=item["id"],
-                        description=item.get("description", ""),
-                        severity=item.get("severity", "low"),
-                        condition=item["condition"],
-                        tags=item.get("tags", []),
-                        frameworks=item.get("frameworks", []),
-                    )
-                )
+        self._load_rules()
+
+    def maybe_reload(self) -> bool:
+        """
+        Przeładowuje reguły lokalne, jeśli pliki *.yml w rules_dir zmieniły się
+        od ostatniego ładowania (nowszy mtime albo inna liczba plików).
+        Silniki z bundla serwera (version != None) odświeża ETag – tu nic nie robimy.
+        Zwraca True, jeśli reguły zostały przeładowane.
+        """
+        if self.version is not None:
+            return False
+        paths = sorted(self.rules_dir.glob("*.yml")) if self.rules_dir.exists() else []
+        if self._signature(paths) == self._files_signature:
+            return False
+        self.load_from_files()
+        return True
+
+    @staticmethod
+    def _signature(paths: List[Path]) -> tuple[int, int]:
+        return len(paths), max((p.stat().st_mtime_ns for p in paths), default=0)
 
     def _load_rules(self) -> None:
         if not self.rules_dir.exists():
+            self._files_signature = (0, 0)
             return
 
-        for path in sorted(self.rules_dir.glob("*.yml")):
-            with path.open("r", encoding="utf-8") as f:
-                data = yaml.safe_load(f) or []
-            if not isinstance(data, list):
-                continue
+        paths = sorted(self.rules_dir.glob("*.yml"))
+        self._files_signature = self._signature(paths)
+        if len(paths) > 1:
+            # Odczyt + parsowanie plików równolegle; map() zachowuje kolejność
+            workers = min(8, os.cpu_count() or 4, len(paths))
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                loaded = list(ex.map(_parse_rules_file, paths))
+        else:
+            loaded = [_parse_rules_file(p) for p in paths]
+
+        for data in loaded:
             for item in data:
-                self.rules.append(
-                    Rule(
-                        id=item["id"],
-                        description=item.get("description", ""),
-                        severity=item.get("severity", "low"),
-                        condition=item["condition"],
-                        tags=item.get("tags", []),
-                        frameworks=item.get("frameworks", []),
-                    )
-                )
+                self.rules.append(_rule_from_item(item))
 
     def evaluate(self, data: Dict[str, Any]) -> List[RuleResult]:
-        results: List[RuleResult] = []
-        now = dt.datetime.utcnow().isoformat() + "Z"
+        if not self.rules:
+            return []
+
+        results: List[Optional[RuleResult]] = [None] * len(self.rules)
+        now = (
+            dt.datetime.now(dt.timezone.utc)
+            .isoformat(timespec="seconds")
+            .replace("+00:00", "Z")
+        )
 
         ctx: Dict[str, Any] = {"data": data}
         ctx.update(data)
 
-        for rule in self.rules:
-            try:
-                passed = bool(eval(rule.condition, {"__builtins__": {}}, ctx))
-                details = None
-            except Exception as e:
+        for i, rule in enumerate(self.rules):
+            if rule.ast_root is None:
                 passed = False
-                details = f"Rule evaluation error: {e}"
-
-            results.append(
-                RuleResult(
-                    rule_id=rule.id,
-                    passed=passed,
-                    severity=rule.severity,
-                    description=rule.description,
-                    tags=rule.tags,
-                    frameworks=rule.frameworks,
-                    details=details,
-                    timestamp=now,
+                details = rule.error
+            elif rule.referenced_keys and rule.referenced_keys.isdisjoint(ctx):
+                # Żadna z danych, których dotyczy reguła, nie istnieje w skanie
+                passed = False
+                details = "Rule evaluation error: no referenced data in scan ({})".format(
+                    ", ".join(sorted(rule.referenced_keys))
                 )
+            else:
+                try:
+                    passed = bool(_eval_node(rule.ast_root, ctx))
+                    details = None
+                except Exception as e:
+                    passed = False
+                    details = f"Rule evaluation error: {e}"
+
+            # Argumenty pozycyjne (kolejność pól RuleResult) – szybsze niż kwargs
+            results[i] = RuleResult(
+                rule.id,
+                passed,
+                rule.severity,
+                rule.description,
+                rule.tags,
+                rule.frameworks,
+                details,
+                now,
             )
 
-        return results
+        return results  # type: ignore[return-value]
 
     @staticmethod
     def serialize_result(result: RuleResult) -> Dict[str, Any]:
+        # Literał słownika jest w CPythonie szybszy od getattr() w pętli
         return {
             "rule_id": result.rule_id,
             "passed": result.passed,
@@ -1,11 +1,12 @@
 from __future__ import annotations
 
 import platform
+import re
 import socket
 import subprocess
 from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterable, Iterator, List, Optional
 
 
 @dataclass
@@ -29,35 +30,59 @@ def get_os_info() -> Dict[str, Any]:
     }
 
 
+def _iter_ss_ports(lines: Iterable[str]) -> Iterator[int]:
+    for line in lines:
+        parts = line.split()
+        if len(parts) < 5 or parts[0] == "Netid":
+            continue
+        # Format: 0.0.0.0:22 albo [::]:80
+        _, sep, port_str = parts[4].rpartition(":")
+        if sep and port_str.isdigit():
+            yield int(port_str)
+
+
 def _parse_ss_output(output: str) -> List[int]:
     """
     Parsuje wynik 'ss -tuln' do listy portów TCP.
     """
-    ports: List[int] = []
-    for line in output.splitlines():
-        line = line.strip()
-        if not line or line.startswith("Netid"):
-            continue
-        parts = line.split()
-        if len(parts) < 5:
-            continue
-        local_addr = parts[4]
-        # Format: 0.0.0.0:22 albo [::]:80
-        if ":" not in local_addr:
-            continue
+    return sorted(set(_iter_ss_ports(output.splitlines())))
+
+
+_PROC_NET_TCP = ("/proc/net/tcp", "/proc/net/tcp6")
+_TCP_LISTEN = 0x0A
+
+
+def _read_proc_listen_ports() -> Optional[List[int]]:
+    """
+    Czyta porty TCP w stanie LISTEN bezpośrednio z /proc/net/tcp{,6}.
+    Zwraca None, jeśli /proc/net/tcp nie istnieje (np. Windows, macOS).
+    """
+    ports = set()
+    for proc_path in _PROC_NET_TCP:
         try:
-            port_str = local_addr.rsplit(":", 1)[1]
-            port = int(port_str)
-            ports.append(port)
-        except ValueError:
-            continue
-    return sorted(set(ports))
+            lines = Path(proc_path).read_text().splitlines()[1:]
+        except OSError:
+            if proc_path == _PROC_NET_TCP[0]:
+                return None
+            continue  # brak IPv6
+        for line in lines:
+            # sl local_address rem_address st ...; adres: HEXIP:HEXPORT
+            parts = line.split()
+            if len(parts) < 4 or int(parts[3], 16) != _TCP_LISTEN:
+                continue
+            ports.add(int(parts[1].rsplit(":", 1)[1], 16))
+    return sorted(ports)
 
 
 def get_open_tcp_ports() -> List[int]:
     """
-    Próbuje użyć 'ss -tuln'; jeśli brak, zwraca pustą listę.
+    Na Linuksie czyta /proc/net/tcp{,6}; w pozostałych przypadkach
+    próbuje użyć 'ss -tuln'; jeśli brak, zwraca pustą listę.
     """
+    ports = _read_proc_listen_ports()
+    if ports is not None:
+        return ports
+
     try:
         proc = subprocess.run(
             ["ss", "-tuln"],
@@ -73,6 +98,18 @@ def get_open_tcp_ports() -> List[int]:
         return []
 
 
+# Opcja na początku linii (linie z "#" nie pasują), separator: spacje lub "=".
+# sshd bierze pierwsze wystąpienie opcji, więc wystarcza pojedyncze search().
+_RE_PERMITROOT = re.compile(
+    r"^[ \t]*PermitRootLogin(?:[ \t]*=[ \t]*|[ \t]+)(\S+)",
+    re.MULTILINE | re.IGNORECASE,
+)
+_RE_PASSWORDAUTH = re.compile(
+    r"^[ \t]*PasswordAuthentication(?:[ \t]*=[ \t]*|[ \t]+)(\S+)",
+    re.MULTILINE | re.IGNORECASE,
+)
+
+
 def parse_sshd_config(path: str = "/etc/ssh/sshd_config") -> Dict[str, Any]:
     """
     Parsuje tylko kilka podstawowych opcji z sshd_config.
@@ -85,24 +122,17 @@ def parse_sshd_config(path: str = "/etc/ssh/sshd_config") -> Dict[str, Any]:
         return result
 
     try:
-        with cfg_path.open("r", encoding="utf-8", errors="ignore") as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue
-                parts = line.split(None, 1)
-                if len(parts) != 2:
-                    continue
-                key, value = parts
-                key_lower = key.lower()
-                value_stripped = value.strip()
-                if key_lower == "permitrootlogin":
-                    result["permit_root_login"] = value_stripped
-                elif key_lower == "passwordauthentication":
-                    result["password_authentication"] = value_stripped
+        text = cfg_path.read_text(encoding="utf-8", errors="ignore")
     except Exception:
         # W PoC nie panikujemy – po prostu zwracamy to, co mamy
-        pass
+        return result
+
+    m = _RE_PERMITROOT.search(text)
+    if m:
+        result["permit_root_login"] = m.group(1)
+    m = _RE_PASSWORDAUTH.search(text)
+    if m:
+        result["password_authentication"] = m.group(1)
 
     return result
 
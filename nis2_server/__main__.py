@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import importlib.util
+import os
+
+import uvicorn
+
+
+def main() -> None:
+    """
+    Produkcyjny start serwera: python -m nis2_server
+
+    - uvloop + httptools (z uvicorn[standard]); na Windows, gdzie uvloop
+      nie istnieje, spada do asyncio,
+    - bez access logu uvicorna (serwer loguje przyjęte raporty sam),
+    - liczba workerów z WEB_CONCURRENCY (domyślnie 1),
+    - opcjonalny limit równoczesnych połączeń z LIMIT_CONCURRENCY
+      (ponad limit uvicorn od razu odpowiada 503 zamiast kolejkować).
+
+    Domyślnie 1 worker: index.json agenta jest aktualizowany w trybie
+    read-modify-write, więc kilka procesów wymaga świadomej decyzji.
+    """
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    http = "httptools" if importlib.util.find_spec("httptools") else "h11"
+    limit = os.environ.get("LIMIT_CONCURRENCY")
+
+    uvicorn.run(
+        "nis2_server.main:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8000")),
+        loop=loop,
+        http=http,
+        workers=int(os.environ.get("WEB_CONCURRENCY", "1")),
+        access_log=False,
+        limit_concurrency=int(limit) if limit else None,
+    )
+
+
+if __name__ == "__main__":
+    main()
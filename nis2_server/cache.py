@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, Optional, Set, Tuple
+
+
+class TTLCache:
+    """
+    Mały, wątkowo bezpieczny cache w pamięci procesu:
+    - wpisy wygasają po `ttl` sekundach,
+    - po przekroczeniu `maxsize` usuwany jest najstarszy wpis.
+
+    Handlery storage działają w threadpoolu, stąd lock.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 1024) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            expires_at, value = item
+            if expires_at <= now:
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+def body_etag(body: bytes) -> str:
+    """
+    Silny ETag dla treści odpowiedzi (blake2b, 128 bitów – szybszy od sha256).
+    """
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    body: bytes
+    etag: str
+    expires_at: float
+
+
+class ResponseCache:
+    """
+    Cache gotowych odpowiedzi JSON (bajty + ETag) z TTL ustawianym per wpis.
+    Wpisy są grupowane w przestrzenie nazw (np. "agent:<id>", "rules"),
+    dzięki czemu zapis raportu unieważnia tylko odpowiedzi danego agenta.
+    """
+
+    def __init__(self, maxsize: int = 2048) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple[str, Hashable], CachedResponse]" = OrderedDict()
+        self._namespaces: Dict[str, Set[Hashable]] = {}
+        # Ostatnia udana odpowiedź per klucz, bez TTL i bez unieważniania –
+        # awaryjna kopia na wypadek błędu storage
+        self._stale: "OrderedDict[Tuple[str, Hashable], CachedResponse]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, namespace: str, key: Hashable) -> Optional[CachedResponse]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get((namespace, key))
+            if entry is None:
+                return None
+            if entry.expires_at <= now:
+                self._remove((namespace, key))
+                return None
+            return entry
+
+    def set(
+        self,
+        namespace: str,
+        key: Hashable,
+        body: bytes,
+        ttl: float,
+        etag: Optional[str] = None,
+    ) -> CachedResponse:
+        entry = CachedResponse(
+            body=body,
+            etag=etag or body_etag(body),
+            expires_at=time.monotonic() + ttl,
+        )
+        with self._lock:
+            self._data[(namespace, key)] = entry
+            self._data.move_to_end((namespace, key))
+            self._namespaces.setdefault(namespace, set()).add(key)
+            while len(self._data) > self.maxsize:
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+            self._stale[(namespace, key)] = entry
+            self._stale.move_to_end((namespace, key))
+            while len(self._stale) > self.maxsize:
+                self._stale.popitem(last=False)
+        return entry
+
+    def get_stale(self, namespace: str, key: Hashable) -> Optional[CachedResponse]:
+        with self._lock:
+            return self._stale.get((namespace, key))
+
+    def clear_namespace(self, namespace: str) -> None:
+        with self._lock:
+            for key in self._namespaces.pop(namespace, ()):
+                self._data.pop((namespace, key), None)
+
+    def _remove(self, full_key: Tuple[str, Hashable]) -> None:
+        self._data.pop(full_key, None)
+        keys = self._namespaces.get(full_key[0])
+        if keys is not None:
+            keys.discard(full_key[1])
+            if not keys:
+                del self._namespaces[full_key[0]]
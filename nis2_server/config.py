@@ -12,4 +12,24 @@ DOWNLOADS_DIR.mkdir(parents=True, exist_ok=True)
 
 # Publiczny URL serwera używany m.in. w /register i bootstrap.ps1
 # np. PUBLIC_BASE_URL="https://nis2.example.com"
-PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL")
\ No newline at end of file
+# Normalizowany raz przy starcie (bez końcowego "/"); pusty -> None.
+PUBLIC_BASE_URL = os.environ.get("PUBLIC_BASE_URL", "").strip().rstrip("/") or None
+
+# Jeśli serwer stoi za nginx: prefiks lokalizacji "internal" wskazującej na
+# katalog downloads, np. DOWNLOADS_ACCEL_REDIRECT="/_protected". Wtedy EXE
+# wysyła nginx (X-Accel-Redirect), a worker Pythona zwraca tylko nagłówki.
+DOWNLOADS_ACCEL_REDIRECT = (
+    os.environ.get("DOWNLOADS_ACCEL_REDIRECT", "").strip().rstrip("/") or None
+)
+
+# Górny limit rozmiaru raportu (po rozpakowaniu gzip) – chroni przed
+# "gzip bomb" na endpointcie przyjmującym raporty; większe ciało -> 413.
+MAX_REPORT_BYTES = int(os.environ.get("MAX_REPORT_BYTES", str(16 * 1024 * 1024)))
+
+# Przy błędzie storage endpointy GET z cache mogą zwrócić ostatnią udaną
+# odpowiedź (nagłówek X-Cache: stale) zamiast błędu 500.
+CACHE_FALLBACK_ENABLED = os.environ.get("CACHE_FALLBACK_ENABLED", "0").lower() in (
+    "1",
+    "true",
+    "yes",
+)
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Set
+
+
+class EventBroker:
+    """
+    Prosty pub/sub w pamięci procesu dla strumieni push (SSE, WebSocket).
+    Każdy subskrybent dostaje własną, ograniczoną kolejkę; jeśli klient
+    nie nadąża, nadmiarowe zdarzenia są dla niego pomijane.
+
+    Metody wołamy z wątku pętli zdarzeń. Przy kilku workerach każdy
+    proces ma własny broker – zdarzenie trafia tylko do klientów
+    podłączonych do workera, który przyjął raport.
+    """
+
+    def __init__(self, max_queue: int = 100) -> None:
+        self.max_queue = max_queue
+        self._subscribers: Set[asyncio.Queue] = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.max_queue)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+
+    def publish(self, data: bytes) -> None:
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                pass
@@ -1,6 +1,5 @@
 import logging
 from logging.handlers import RotatingFileHandler
-from pathlib import Path
 
 from .config import DATA_DIR
 
@@ -1,22 +1,52 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import gzip
 import hashlib
-import json
-
-from fastapi import FastAPI, HTTPException, Request
+import os
+import re
+import zlib
+from email.utils import formatdate
+from functools import lru_cache
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional
+from urllib.parse import parse_qs
+
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Request, WebSocket
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.openapi.utils import get_openapi
+from fastapi.routing import APIRoute
+from fastapi.staticfiles import StaticFiles
 from fastapi.responses import (
     HTMLResponse,
     JSONResponse,
     PlainTextResponse,
     FileResponse,
+    Response,
+    StreamingResponse,
 )
-import yaml
+import orjson
+from pydantic import TypeAdapter, ValidationError
+from starlette.datastructures import Headers
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:  # opcjonalna zależność – bez niej zostaje gzip
+    BrotliMiddleware = None
 
+from .cache import CachedResponse, ResponseCache, body_etag
+from .events import EventBroker
 from .logging_config import setup_logging
+from .middleware import PathPrefixMiddleware
 from .models import (
     AgentReportCreate,
     AgentSummary,
+    AgentSummaryWithLatest,
+    DashboardData,
     ReportSummary,
     AgentConfig,
     ReportHistoryPoint,
@@ -25,13 +55,95 @@ from .models import (
     WhatIfResult,
 )
 from . import storage
-from .config import DOWNLOADS_DIR, BASE_DIR, PUBLIC_BASE_URL
-from .rules_catalog import load_rules_catalog, get_framework_index
+from .config import (
+    CACHE_FALLBACK_ENABLED,
+    DOWNLOADS_ACCEL_REDIRECT,
+    DOWNLOADS_DIR,
+    MAX_REPORT_BYTES,
+    PUBLIC_BASE_URL,
+)
+from .rules_catalog import (
+    get_framework_index,
+    get_frameworks_summary,
+    get_rules_bundle as rules_bundle,
+    load_rules_catalog,
+)
 
 
 logger = setup_logging()
 
+events = EventBroker()
+
+
+class GzipRequest(Request):
+    """
+    Request, który przezroczyście rozpakowuje ciało wysłane
+    z nagłówkiem Content-Encoding: gzip (agent kompresuje duże raporty).
+    """
+
+    async def body(self) -> bytes:
+        if not hasattr(self, "_body"):
+            body = await super().body()
+            codings = [
+                token.strip().lower()
+                for value in self.headers.getlist("content-encoding")
+                for token in value.split(",")
+                if token.strip().lower() not in ("", "identity")
+            ]
+            if codings in (["gzip"], ["x-gzip"]):
+                body = _gunzip_limited(body, MAX_REPORT_BYTES)
+            elif codings:
+                raise HTTPException(
+                    status_code=415,
+                    detail=f"Unsupported Content-Encoding: {', '.join(codings)}",
+                )
+            if len(body) > MAX_REPORT_BYTES:
+                raise HTTPException(status_code=413, detail="Report body too large")
+            self._body = body
+        return self._body
+
+
+def _gunzip_limited(body: bytes, max_bytes: int) -> bytes:
+    """
+    Rozpakowuje gzip najwyżej do max_bytes – większa treść (albo
+    nierozpakowana reszta strumienia) kończy się 413 zamiast zajęcia pamięci.
+    """
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        data = decompressor.decompress(body, max_bytes + 1)
+    except zlib.error:
+        raise HTTPException(status_code=400, detail="Invalid gzip body")
+    if len(data) > max_bytes or decompressor.unconsumed_tail:
+        raise HTTPException(status_code=413, detail="Report body too large")
+    if not decompressor.eof:
+        raise HTTPException(status_code=400, detail="Invalid gzip body")
+    return data
+
+
+class GzipRoute(APIRoute):
+    def get_route_handler(self) -> Callable:
+        original_route_handler = super().get_route_handler()
+
+        async def custom_route_handler(request: Request) -> Response:
+            request = GzipRequest(request.scope, request.receive)
+            return await original_route_handler(request)
+
+        return custom_route_handler
+
+
+class OrjsonResponse(JSONResponse):
+    """
+    JSONResponse renderowany przez orjson zamiast stdlib json.
+    (fastapi.responses.ORJSONResponse jest w tej wersji FastAPI oznaczony
+    jako przestarzały.)
+    """
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
 app = FastAPI(
+    default_response_class=OrjsonResponse,
     title="NIS2 Server",
     version="0.3.0",
     description=(
@@ -40,14 +152,150 @@ app = FastAPI(
     ),
 )
 
+
+def _custom_openapi() -> dict:
+    """
+    ingest_report czyta surowe ciało żądania, więc FastAPI nie zna jego
+    modelu – schemat AgentReportCreate (z zależnościami) dokładamy ręcznie.
+    """
+    if app.openapi_schema:
+        return app.openapi_schema
+    schema = get_openapi(
+        title=app.title,
+        version=app.version,
+        description=app.description,
+        routes=app.routes,
+    )
+    report_schema = AgentReportCreate.model_json_schema(
+        ref_template="#/components/schemas/{model}"
+    )
+    components = schema.setdefault("components", {}).setdefault("schemas", {})
+    components.update(report_schema.pop("$defs", {}))
+    components["AgentReportCreate"] = report_schema
+    app.openapi_schema = schema
+    return schema
+
+
+app.openapi = _custom_openapi
+
+# Wszystkie trasy rozumieją ciała gzip – musi być ustawione przed dekoratorami
+app.router.route_class = GzipRoute
+
+# CORS potrzebne jest tylko dla API JSON; pobieranie EXE, /register
+# i dashboard (ten sam origin) obsługiwane są bez niego.
 app.add_middleware(
-    CORSMiddleware,
+    PathPrefixMiddleware,
+    wrapped_class=CORSMiddleware,
+    prefixes=("/api/",),
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Przeglądarka cache'uje preflight na dobę zamiast domyślnych 10 minut
+    max_age=86400,
 )
 
 
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """
+    Czy klient akceptuje gzip wg Accept-Encoding z wartościami q:
+    jawne "gzip" ma pierwszeństwo przed "*", a q=0 oznacza odmowę.
+    """
+    qualities: dict[str, float] = {}
+    for token in accept_encoding.split(","):
+        coding, _, params = token.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qualities[coding] = q
+    q = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0.0)))
+    return q > 0
+
+
+class QualityGZipMiddleware(GZipMiddleware):
+    """
+    GZipMiddleware sprawdza tylko, czy "gzip" występuje w Accept-Encoding,
+    więc kompresowałby też przy "gzip;q=0" – tu decyduje _accepts_gzip.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and not _accepts_gzip(
+            Headers(scope=scope).get("accept-encoding", "")
+        ):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Kompresja odpowiedzi (JSON API, /register, docs). EXE pomijamy – słabo się
+# kompresuje, a gzip w locie wyłączyłby Range i wysyłkę pliku bez kopiowania.
+# Z zainstalowanym brotli-asgi klienci z "br" w Accept-Encoding dostają
+# Brotli (quality=4: mniej bajtów niż gzip przy podobnym koszcie CPU),
+# pozostali – gzip jak dotąd. Strumień SSE zostawiamy bez kompresji.
+# Jedna lista wyłączeń dla obu wariantów, żeby się nie rozjechały.
+COMPRESSION_EXCLUDE_PREFIXES = ("/downloads/", "/api/v1/stream")
+
+if BrotliMiddleware is not None:
+    app.add_middleware(
+        PathPrefixMiddleware,
+        wrapped_class=BrotliMiddleware,
+        prefixes=("/",),
+        exclude_prefixes=COMPRESSION_EXCLUDE_PREFIXES,
+        minimum_size=500,
+        quality=4,
+    )
+else:
+    app.add_middleware(
+        PathPrefixMiddleware,
+        wrapped_class=QualityGZipMiddleware,
+        prefixes=("/",),
+        exclude_prefixes=COMPRESSION_EXCLUDE_PREFIXES,
+        minimum_size=500,
+        compresslevel=6,
+    )
+
+
+@lru_cache(maxsize=64)
+def _asset_version(path: str, mtime_ns: int, size: int) -> str:
+    """
+    Wersja pliku statycznego (skrót treści) – liczona raz na (mtime, rozmiar).
+    """
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+
+
+class VersionedStaticFiles(StaticFiles):
+    """
+    StaticFiles (ETag, If-Modified-Since, Range), a dla adresów z ?v=<hash>
+    zgodnym z aktualną treścią pliku – Cache-Control na rok z "immutable".
+    Bez wersji (albo z nieaktualną) przeglądarka zawsze rewaliduje.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        current = _asset_version(
+            str(full_path), stat_result.st_mtime_ns, stat_result.st_size
+        )
+        if query.get("v") == [current]:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+
+# CSS/JS dashboardu jako zwykłe pliki, proxy/CDN może je cache'ować.
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+app.mount("/static", VersionedStaticFiles(directory=STATIC_DIR), name="static")
+
+
 def _get_base_url(request: Request) -> str:
     """
     Zwraca bazowy publiczny URL serwera używany w bootstrapie /register.
@@ -55,35 +303,334 @@ def _get_base_url(request: Request) -> str:
     W przeciwnym razie bazuje na request.base_url.
     """
     if PUBLIC_BASE_URL:
-        return PUBLIC_BASE_URL.rstrip("/")
+        return PUBLIC_BASE_URL
     return str(request.base_url).rstrip("/")
 
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    """
+    Sprawdza, czy nagłówek If-None-Match klienta pasuje do podanego ETaga
+    (obsługuje listę wartości, '*' oraz słabe ETagi W/"...").
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    wanted = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == wanted
+        for candidate in header.split(",")
+    )
+
+
+# Modele zwracane przez storage są już zwalidowane – serializujemy je
+# bezpośrednio w pydantic-core do bajtów, z pominięciem ponownej walidacji
+# response_model i jsonable_encoder (response_model zostaje dla OpenAPI).
+_AGENT_SUMMARY_LIST = TypeAdapter(list[AgentSummary])
+_AGENT_WITH_LATEST_LIST = TypeAdapter(list[AgentSummaryWithLatest])
+_HISTORY_LIST = TypeAdapter(list[ReportHistoryPoint])
+_RULE_DEFINITION_LIST = TypeAdapter(list[RuleDefinition])
+_WHAT_IF_BY_FRAMEWORK = TypeAdapter(dict[str, WhatIfResult])
+
+
+def _json_response(body: bytes | str, headers: dict | None = None) -> Response:
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Cache gotowych odpowiedzi GET (bajty JSON + ETag). Dane zmieniają się
+# tylko przy nowym raporcie, który czyści przestrzeń "agent:<id>" i "agents";
+# reguły ("rules") zmieniają się rzadko i po prostu wygasają.
+CACHE_TTL_SHORT = 5
+CACHE_TTL_NORMAL = 30
+CACHE_TTL_LONG = 300
+
+response_cache = ResponseCache()
+
+
+def _cache_key(request: Request) -> tuple[str, str]:
+    return (request.url.path, request.url.query)
+
+
+def _cached_entry_response(
+    request: Request,
+    entry: CachedResponse,
+    namespace: str,
+    ttl: int,
+    media_type: str = "application/json",
+) -> Response:
+    # Dane agentów przeglądarka zawsze rewaliduje (ETag -> 304), bo dashboard
+    # po zdarzeniu SSE musi od razu zobaczyć nowy stan; reguły może trzymać.
+    if namespace == "rules":
+        cache_control = f"public, max-age={ttl}"
+    else:
+        cache_control = "no-cache"
+    headers = {"ETag": entry.etag, "Cache-Control": cache_control}
+    if _etag_matches(request, entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type=media_type, headers=headers)
+
+
+def _stale_or_raise(
+    request: Request,
+    namespace: str,
+    key: tuple[str, str],
+    exc: Exception,
+    media_type: str = "application/json",
+) -> Response:
+    """
+    Przy włączonym CACHE_FALLBACK_ENABLED zwraca ostatnią udaną odpowiedź
+    z nagłówkiem X-Cache: stale, inaczej rzuca dalej przekazany wyjątek exc.
+    """
+    stale = response_cache.get_stale(namespace, key) if CACHE_FALLBACK_ENABLED else None
+    if stale is None:
+        raise exc
+    logger.warning("Storage error on %s, serving stale response", request.url.path)
+    return Response(
+        content=stale.body,
+        media_type=media_type,
+        headers={"ETag": stale.etag, "Cache-Control": "no-cache", "X-Cache": "stale"},
+    )
+
+
+async def _cached_response(
+    request: Request,
+    namespace: str,
+    ttl: int,
+    build: Callable[[], bytes],
+    media_type: str = "application/json",
+    validator: Optional[Callable[[], Optional[str]]] = None,
+) -> Response:
+    """
+    Zwraca odpowiedź z cache albo buduje ją przez build() i zapamiętuje
+    na ttl sekund. Trafienie w cache obsługiwane jest na pętli zdarzeń bez
+    przejścia przez threadpool; build() (odczyt storage) idzie do threadpoola,
+    więc wolny dysk nie blokuje /health ani innych endpointów.
+
+    validator (opcjonalny) to tani ETag liczony bez budowania odpowiedzi –
+    przy braku wpisu w cache i zgodnym If-None-Match zwracamy 304 bez build().
+    """
+    key = _cache_key(request)
+    entry = response_cache.get(namespace, key)
+    if entry is None:
+
+        def produce() -> tuple[Optional[str], Optional[bytes]]:
+            etag = validator() if validator is not None else None
+            if etag is not None and _etag_matches(request, etag):
+                return etag, None
+            return etag, build()
+
+        try:
+            etag, body = await run_in_threadpool(produce)
+        except HTTPException:
+            raise
+        except Exception as exc:
+            return _stale_or_raise(request, namespace, key, exc, media_type)
+        if body is None:
+            return Response(
+                status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"}
+            )
+        entry = response_cache.set(namespace, key, body, ttl, etag=etag)
+    return _cached_entry_response(request, entry, namespace, ttl, media_type)
+
+
 @app.get("/health", tags=["meta"])
-def health() -> dict:
+async def health() -> dict:
     return {"status": "ok"}
 
 
-@app.post("/api/v1/reports", tags=["reports"])
-def ingest_report(report: AgentReportCreate) -> dict:
+# HEAD (prewarm połączenia przez agenta) – osobny handler poza schematem,
+# żeby OpenAPI nie dostało zduplikowanego operationId
+@app.head("/health", include_in_schema=False)
+async def health_head() -> Response:
+    return Response()
+
+
+@app.post(
+    "/api/v1/reports",
+    tags=["reports"],
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"$ref": "#/components/schemas/AgentReportCreate"}
+                }
+            },
+        }
+    },
+)
+async def ingest_report(
+    request: Request, background_tasks: BackgroundTasks
+) -> dict:
+    """
+    Przyjmuje raport agenta. Ciało (już rozpakowane z gzip) parsuje
+    i waliduje pydantic-core w jednym kroku – bez pośredniego json.loads
+    i słownika po stronie Pythona.
+    """
+    body = await request.body()
+    try:
+        report = AgentReportCreate.model_validate_json(body)
+    except ValidationError as e:
+        # Ten sam kształt 422 co przy parametrze-modelu (loc zaczyna się od "body")
+        errors = [
+            {**err, "loc": ("body", *err["loc"])}
+            for err in e.errors(include_url=False)
+        ]
+        raise RequestValidationError(errors, body=body)
+
     logger.info(
         "Received report from agent '%s', hostname='%s', rules=%d",
         report.agent_id,
         report.scan.hostname,
         len(report.rules),
     )
-    ts = storage.save_report(report)
-    logger.info("Report saved with timestamp %s", ts)
+    # Agent dostaje potwierdzenie od razu; zapis na dysk idzie po odpowiedzi
+    ts = storage.allocate_timestamp()
+    background_tasks.add_task(_persist_report, report, ts)
     return {"status": "ok", "timestamp": ts}
 
 
+async def _persist_report(report: AgentReportCreate, ts: str) -> None:
+    try:
+        await run_in_threadpool(storage.persist_report, report, ts)
+    except Exception:
+        logger.exception(
+            "Failed to persist report from agent '%s' (timestamp %s)",
+            report.agent_id,
+            ts,
+        )
+        return
+    logger.info("Report saved with timestamp %s", ts)
+    response_cache.clear_namespace("agents")
+    response_cache.clear_namespace(f"agent:{report.agent_id}")
+
+    # Powiadom podłączone dashboardy (SSE / WebSocket) o nowym stanie agenta
+    summary = await run_in_threadpool(storage.get_agent_summary, report.agent_id)
+    events.publish(summary.model_dump_json().encode("utf-8"))
+
+
+# Odstęp komentarzy keep-alive w strumieniu SSE (proxy nie zamknie połączenia)
+SSE_KEEPALIVE_SECONDS = 15.0
+
+
+async def _agent_event_stream(request: Request) -> AsyncIterator[bytes]:
+    queue = events.subscribe()
+    try:
+        yield b"retry: 5000\n\n"
+        while not await request.is_disconnected():
+            try:
+                data = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield b"event: agent\ndata: " + data + b"\n\n"
+    finally:
+        events.unsubscribe(queue)
+
+
+@app.get("/api/v1/stream", tags=["agents"])
+async def agent_stream(request: Request):
+    """
+    Server-Sent Events: po każdym zapisanym raporcie wysyłane jest
+    zdarzenie "agent" z aktualnym AgentSummary (JSON). Dashboard
+    nie musi odpytywać listy agentów w pętli.
+    """
+    return StreamingResponse(
+        _agent_event_stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/ws/dashboard")
+async def dashboard_ws(websocket: WebSocket) -> None:
+    """
+    To samo co /api/v1/stream, ale po WebSocket: każda wiadomość tekstowa
+    to AgentSummary (JSON) agenta, który właśnie przysłał raport.
+    Ping/pong utrzymuje uvicorn; wiadomości od klienta są ignorowane.
+    """
+    await websocket.accept()
+    queue = events.subscribe()
+
+    async def forward() -> None:
+        while True:
+            data = await queue.get()
+            await websocket.send_text(data.decode("utf-8"))
+
+    async def watch_disconnect() -> None:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+
+    # Kończy się, gdy klient się rozłączy albo wysyłka padnie na zamkniętym
+    # sockecie; drugie zadanie anulujemy i odbieramy wyniki obu, żeby
+    # wyjątek wysyłki nie został "never retrieved".
+    tasks = [asyncio.create_task(forward()), asyncio.create_task(watch_disconnect())]
+    try:
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            with contextlib.suppress(Exception, asyncio.CancelledError):
+                await task
+        events.unsubscribe(queue)
+
+
+AGENT_LIST_INCLUDES = {"latest"}
+
+
 @app.get(
     "/api/v1/agents",
-    response_model=list[AgentSummary],
+    response_model=list[AgentSummaryWithLatest],
     tags=["agents"],
 )
-def list_agents_endpoint():
-    return storage.list_agents()
+async def list_agents_endpoint(request: Request, include: str = ""):
+    """
+    Lista agentów. include=latest dołącza do każdego agenta ostatni raport
+    (pole latest) – wszystko w jednym zapytaniu zamiast 1 + N.
+    """
+    includes = {part.strip() for part in include.split(",") if part.strip()}
+    unknown = includes - AGENT_LIST_INCLUDES
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported include value(s): {', '.join(sorted(unknown))}",
+        )
+
+    def build() -> bytes:
+        if "latest" in includes:
+            return _AGENT_WITH_LATEST_LIST.dump_json(storage.list_agents_with_latest())
+        return _AGENT_SUMMARY_LIST.dump_json(storage.list_agents())
+
+    return await _cached_response(request, "agents", CACHE_TTL_SHORT, build)
+
+
+@app.get(
+    "/api/v1/dashboard",
+    response_model=DashboardData,
+    tags=["dashboard"],
+)
+async def dashboard_data(request: Request):
+    """
+    Lista agentów + ostatni raport każdego z nich w jednej odpowiedzi
+    (zamiast 1 + N zapytań z dashboardu / pollerów).
+    """
+    return await _cached_response(
+        request,
+        "agents",
+        CACHE_TTL_SHORT,
+        lambda: storage.get_dashboard_data().model_dump_json().encode("utf-8"),
+    )
+
+
+def _latest_summary_json(agent_id: str) -> bytes:
+    summary = storage.get_latest_report_summary(agent_id)
+    if not summary:
+        raise HTTPException(status_code=404, detail="No reports for this agent")
+    return summary.model_dump_json().encode("utf-8")
 
 
 @app.get(
@@ -91,11 +638,21 @@ def list_agents_endpoint():
     response_model=ReportSummary,
     tags=["agents"],
 )
-def get_latest(agent_id: str):
-    summary = storage.get_latest_report_summary(agent_id)
+async def get_latest(agent_id: str, request: Request):
+    return await _cached_response(
+        request,
+        f"agent:{agent_id}",
+        CACHE_TTL_SHORT,
+        lambda: _latest_summary_json(agent_id),
+        validator=lambda: storage.latest_report_validator(agent_id),
+    )
+
+
+def _latest_enriched_json(agent_id: str) -> bytes:
+    summary = storage.get_latest_report_summary_enriched(agent_id)
     if not summary:
         raise HTTPException(status_code=404, detail="No reports for this agent")
-    return summary
+    return summary.model_dump_json().encode("utf-8")
 
 
 @app.get(
@@ -103,22 +660,26 @@ def get_latest(agent_id: str):
     response_model=ReportSummaryEnriched,
     tags=["agents"],
 )
-def get_latest_enriched(agent_id: str):
-    summary = storage.get_latest_report_summary_enriched(agent_id)
-    if not summary:
-        raise HTTPException(status_code=404, detail="No reports for this agent")
-    return summary
+async def get_latest_enriched(agent_id: str, request: Request):
+    return await _cached_response(
+        request,
+        f"agent:{agent_id}",
+        CACHE_TTL_SHORT,
+        lambda: _latest_enriched_json(agent_id),
+        validator=lambda: storage.latest_report_validator(agent_id, with_config=True),
+    )
 
 
 @app.get(
     "/api/v1/agents/{agent_id}/latest/raw",
     tags=["agents"],
 )
-def get_latest_raw(agent_id: str):
-    data = storage.get_latest_raw_report(agent_id)
+async def get_latest_raw(agent_id: str):
+    data = await run_in_threadpool(storage.get_latest_raw_report, agent_id)
     if not data:
         raise HTTPException(status_code=404, detail="No reports for this agent")
-    return data
+    # Surowy dict z dysku: prosto do orjson, bez przejścia przez jsonable_encoder
+    return _json_response(orjson.dumps(data))
 
 
 @app.get(
@@ -126,8 +687,9 @@ def get_latest_raw(agent_id: str):
     response_model=AgentConfig,
     tags=["agents"],
 )
-def get_agent_config(agent_id: str):
-    return storage.get_agent_config(agent_id)
+async def get_agent_config(agent_id: str):
+    cfg = await run_in_threadpool(storage.get_agent_config, agent_id)
+    return _json_response(cfg.model_dump_json())
 
 
 @app.get(
@@ -135,8 +697,71 @@ def get_agent_config(agent_id: str):
     response_model=list[ReportHistoryPoint],
     tags=["agents"],
 )
-def get_agent_history(agent_id: str, limit: int = 20):
-    return storage.get_report_history(agent_id, limit=limit)
+async def get_agent_history(agent_id: str, request: Request, limit: int = 20):
+    return await _cached_response(
+        request,
+        f"agent:{agent_id}",
+        CACHE_TTL_NORMAL,
+        lambda: _HISTORY_LIST.dump_json(
+            storage.get_report_history(agent_id, limit=limit)
+        ),
+    )
+
+
+SPARKLINE_WIDTH = 600
+SPARKLINE_HEIGHT = 120
+SPARKLINE_PADDING = 10
+
+
+@lru_cache(maxsize=256)
+def _sparkline_svg(risks: tuple[float, ...]) -> bytes:
+    """
+    Wykres trendu risk score jako statyczny SVG (oś + polilinia). Skaluje się
+    do rozmiaru <img>; grubość linii nie zależy od skali.
+    """
+    w, h, pad = SPARKLINE_WIDTH, SPARKLINE_HEIGHT, SPARKLINE_PADDING
+    max_risk = max(risks, default=0.0) or 1.0
+    step_x = (w - 2 * pad) / max(len(risks) - 1, 1)
+    points = " ".join(
+        f"{pad + i * step_x:.1f},{h - pad - (risk / max_risk) * (h - 2 * pad):.1f}"
+        for i, risk in enumerate(risks)
+    )
+    svg = (
+        f'<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 {w} {h}" '
+        f'preserveAspectRatio="none">'
+        f'<line x1="{pad}" y1="{h - pad}" x2="{w - pad}" y2="{h - pad}" '
+        f'stroke="#d1d5db" stroke-width="1" vector-effect="non-scaling-stroke"/>'
+    )
+    if risks:
+        svg += (
+            f'<polyline points="{points}" fill="none" stroke="#111827" '
+            f'stroke-width="1.5" vector-effect="non-scaling-stroke"/>'
+        )
+    return (svg + "</svg>").encode("utf-8")
+
+
+@app.get(
+    "/api/v1/agents/{agent_id}/history/sparkline.svg",
+    response_class=Response,
+    tags=["agents"],
+)
+async def get_history_sparkline(agent_id: str, request: Request, limit: int = 20):
+    """
+    Trend risk score z ostatnich `limit` raportów jako SVG do osadzenia
+    w <img>. Ten sam ciąg wartości daje ten sam SVG (lru_cache) i ETag.
+    """
+
+    def build() -> bytes:
+        history = storage.get_report_history(agent_id, limit=limit)
+        return _sparkline_svg(tuple(point.risk_score for point in history))
+
+    return await _cached_response(
+        request,
+        f"agent:{agent_id}",
+        CACHE_TTL_NORMAL,
+        build,
+        media_type="image/svg+xml",
+    )
 
 
 @app.get(
@@ -144,8 +769,33 @@ def get_agent_history(agent_id: str, limit: int = 20):
     response_model=WhatIfResult,
     tags=["rules"],
 )
-def what_if(agent_id: str, framework: str):
-    return storage.get_what_if(agent_id, framework)
+async def what_if(agent_id: str, framework: str, request: Request):
+    return await _cached_response(
+        request,
+        f"agent:{agent_id}",
+        CACHE_TTL_NORMAL,
+        lambda: storage.get_what_if(agent_id, framework)
+        .model_dump_json()
+        .encode("utf-8"),
+    )
+
+
+@app.get(
+    "/api/v1/agents/{agent_id}/what-if/all",
+    response_model=dict[str, WhatIfResult],
+    tags=["rules"],
+)
+async def what_if_all(agent_id: str, request: Request):
+    """
+    What-if dla wszystkich frameworków w jednej odpowiedzi (framework ->
+    wynik) – dashboard pobiera to raz i przełącza framework bez zapytań.
+    """
+    return await _cached_response(
+        request,
+        f"agent:{agent_id}",
+        CACHE_TTL_NORMAL,
+        lambda: _WHAT_IF_BY_FRAMEWORK.dump_json(storage.get_what_if_all(agent_id)),
+    )
 
 
 @app.get(
@@ -153,19 +803,23 @@ def what_if(agent_id: str, framework: str):
     response_model=list[RuleDefinition],
     tags=["rules"],
 )
-def list_rules():
-    return load_rules_catalog()
+async def list_rules(request: Request):
+    return await _cached_response(
+        request,
+        "rules",
+        CACHE_TTL_LONG,
+        lambda: _RULE_DEFINITION_LIST.dump_json(load_rules_catalog()),
+    )
 
 
 @app.get("/api/v1/frameworks", tags=["rules"])
-def list_frameworks():
-    rules = load_rules_catalog()
-    index = get_framework_index(rules)
-    result = [
-        {"framework": fw, "rules_count": len(rs)}
-        for fw, rs in sorted(index.items(), key=lambda x: x[0])
-    ]
-    return result
+async def list_frameworks(request: Request):
+    return await _cached_response(
+        request,
+        "rules",
+        CACHE_TTL_LONG,
+        lambda: orjson.dumps(get_frameworks_summary()),
+    )
 
 
 @app.get(
@@ -173,21 +827,85 @@ def list_frameworks():
     response_model=list[RuleDefinition],
     tags=["rules"],
 )
-def list_framework_rules(framework: str):
-    rules = load_rules_catalog()
-    index = get_framework_index(rules)
-    return index.get(framework, [])
+async def list_framework_rules(framework: str, request: Request):
+    def build() -> bytes:
+        index = get_framework_index(load_rules_catalog())
+        return _RULE_DEFINITION_LIST.dump_json(index.get(framework, []))
+
+    return await _cached_response(request, "rules", CACHE_TTL_LONG, build)
+
+
+# EXE do tego rozmiaru trzymamy w pamięci (jeden odczyt na wersję pliku);
+# większe idą przez FileResponse.
+EXE_MEMORY_MAX_BYTES = 8 * 1024 * 1024
+
+# (mtime_ns, size) -> (ETag, treść albo None); liczone tylko po zmianie pliku EXE
+_EXE_CACHE: dict[tuple[int, int], tuple[str, Optional[bytes]]] = {}
+
+
+def _exe_cache_entry(path: Path, st: os.stat_result) -> tuple[str, Optional[bytes]]:
+    key = (st.st_mtime_ns, st.st_size)
+    entry = _EXE_CACHE.get(key)
+    if entry is None:
+        if st.st_size <= EXE_MEMORY_MAX_BYTES:
+            content: Optional[bytes] = path.read_bytes()
+            digest = hashlib.sha256(content)
+        else:
+            content = None
+            digest = hashlib.sha256()
+            with path.open("rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        entry = ('"' + digest.hexdigest() + '"', content)
+        _EXE_CACHE.clear()
+        _EXE_CACHE[key] = entry
+    return entry
 
 
 @app.get("/downloads/nis2_agent_win.exe", tags=["downloads"])
-def download_agent_exe():
+async def download_agent_exe(request: Request):
+    """
+    Pobranie agenta EXE. Odpowiedź ma silny ETag (sha256 treści)
+    i Cache-Control, więc ponowne pobrania kończą się 304. Z ustawionym
+    DOWNLOADS_ACCEL_REDIRECT plik wysyła nginx; bez tego małe EXE idą
+    z pamięci, a duże oraz żądania Range obsługuje FileResponse.
+    """
     exe_path = DOWNLOADS_DIR / "nis2_agent_win.exe"
-    if not exe_path.exists():
+    try:
+        st = exe_path.stat()
+    except OSError:
         raise HTTPException(status_code=404, detail="Agent EXE not found on server")
+
+    etag, content = await run_in_threadpool(_exe_cache_entry, exe_path, st)
+    # URL nie jest wersjonowany, więc bez "immutable" – po max-age klient
+    # i tak rewaliduje ETagiem.
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=86400"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    if DOWNLOADS_ACCEL_REDIRECT:
+        headers["X-Accel-Redirect"] = f"{DOWNLOADS_ACCEL_REDIRECT}/nis2_agent_win.exe"
+        headers["Content-Disposition"] = 'attachment; filename="nis2_agent_win.exe"'
+        return Response(
+            media_type="application/vnd.microsoft.portable-executable",
+            headers=headers,
+        )
+
+    if content is not None and "range" not in request.headers:
+        headers["Content-Disposition"] = 'attachment; filename="nis2_agent_win.exe"'
+        headers["Last-Modified"] = formatdate(st.st_mtime, usegmt=True)
+        headers["Accept-Ranges"] = "bytes"
+        return Response(
+            content=content,
+            media_type="application/vnd.microsoft.portable-executable",
+            headers=headers,
+        )
     return FileResponse(
         path=exe_path,
         media_type="application/vnd.microsoft.portable-executable",
         filename="nis2_agent_win.exe",
+        headers=headers,
+        stat_result=st,
     )
 
 
@@ -196,49 +914,47 @@ def download_agent_exe():
     response_class=PlainTextResponse,
     tags=["register"],
 )
-def register_bootstrap(request: Request):
-    base_url = _get_base_url(request)
-
-    script = f"""\
-# NIS2 agent bootstrap script
-# UWAGA: uruchamiaj w PowerShell jako administrator
-
-$ServerUrl = "{base_url}"
-$AgentExeUrl = "$ServerUrl/downloads/nis2_agent_win.exe"
-$InstallDir = "$env:ProgramFiles\\NIS2Agent"
-$AgentExePath = Join-Path $InstallDir "nis2_agent_win.exe"
-$AgentId = $env:COMPUTERNAME
+async def register_bootstrap(request: Request):
+    body, etag = _bootstrap_script(_get_base_url(request))
+    return _bytes_response(request, body, etag, "text/plain; charset=utf-8")
 
-Write-Host "NIS2 Agent installer"
-Write-Host "Server URL: $ServerUrl"
-Write-Host "Agent ID  : $AgentId"
-Write-Host ""
 
-Write-Host "[1/4] Tworzenie katalogu instalacyjnego: $InstallDir"
-New-Item -ItemType Directory -Path $InstallDir -Force | Out-Null
+def _bytes_response(
+    request: Request, body: bytes, etag: str, media_type: str
+) -> Response:
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=60"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
 
-Write-Host "[2/4] Pobieranie agenta z $AgentExeUrl..."
-Invoke-WebRequest -Uri $AgentExeUrl -OutFile $AgentExePath -UseBasicParsing
 
-Write-Host "[3/4] Rejestracja zadania 'NIS2Agent' w Harmonogramie Zadań..."
+# Szablon bootstrap.ps1 czytany raz przy imporcie; poza /static, żeby
+# surowy szablon nie był publicznie serwowany.
+TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
+_BOOTSTRAP_TEMPLATE = (TEMPLATES_DIR / "bootstrap.ps1.tmpl").read_text(encoding="utf-8")
 
-$Action = New-ScheduledTaskAction -Execute $AgentExePath -Argument "--server-url `"$ServerUrl`" --mode loop --agent-id `"$AgentId`" --rules-source remote --rules-dir rules --log-dir logs"
 
-$Trigger = New-ScheduledTaskTrigger -Once -At (Get-Date).AddMinutes(1) -RepetitionInterval (New-TimeSpan -Hours 6) -RepetitionDuration ([TimeSpan]::MaxValue)
+@lru_cache(maxsize=16)
+def _bootstrap_script(base_url: str) -> tuple[bytes, str]:
+    """
+    Treść bootstrap.ps1 dla danego base_url – składana i kodowana raz,
+    kolejne pobrania z floty to tylko odczyt z cache.
+    """
+    body = _BOOTSTRAP_TEMPLATE.replace("{{BASE_URL}}", base_url).encode("utf-8")
+    return body, body_etag(body)
 
-Register-ScheduledTask -TaskName "NIS2Agent" -Action $Action -Trigger $Trigger -RunLevel Highest -User "SYSTEM" -Force
 
-Write-Host "[4/4] Gotowe. Agent będzie uruchamiany co 6 godzin."
-"""
-    return script
+@app.get("/register", response_class=HTMLResponse, tags=["register"])
+async def register_page(request: Request) -> Response:
+    body, etag = _register_page_html(_get_base_url(request))
+    return _bytes_response(request, body, etag, "text/html; charset=utf-8")
 
 
-@app.get("/register", response_class=HTMLResponse, tags=["register"])
-def register_page(request: Request) -> str:
-    base_url = _get_base_url(request)
+@lru_cache(maxsize=16)
+def _register_page_html(base_url: str) -> tuple[bytes, str]:
     bootstrap_url = f"{base_url}/register/bootstrap.ps1"
 
-    return f"""<!DOCTYPE html>
+    html = f"""<!DOCTYPE html>
 <html lang="pl">
 <head>
   <meta charset="UTF-8">
@@ -312,800 +1028,100 @@ def register_page(request: Request) -> str:
 </body>
 </html>
 """
+    body = html.encode("utf-8")
+    return body, body_etag(body)
+
+
+# Szablon dashboardu leży w static/index.html; czytany raz przy imporcie
+# i serwowany z pamięci (zminifikowany, z ETagiem i wersją gzip).
+_DASHBOARD_HTML_SRC = (STATIC_DIR / "index.html").read_text(encoding="utf-8")
+
+
+def _with_asset_versions(html: str) -> str:
+    """
+    Dokleja do odwołań "/static/<plik>" parametr ?v=<hash treści pliku>,
+    dzięki czemu CSS/JS można cache'ować na stałe, a każda zmiana pliku
+    (po restarcie serwera) daje nowy adres.
+    """
+
+    def versioned(match: re.Match) -> str:
+        name = match.group(1)
+        st = (STATIC_DIR / name).stat()
+        version = _asset_version(str(STATIC_DIR / name), st.st_mtime_ns, st.st_size)
+        return f'"/static/{name}?v={version}"'
+
+    return re.sub(r'"/static/([\w.-]+)"', versioned, html)
+
+
+def _minify_html(html: str) -> str:
+    """
+    Prosta minifikacja szablonu: usuwa wcięcia i puste linie. Znaki nowej
+    linii zostają, więc odstępy między elementami inline się nie zmieniają
+    (szablon nie zawiera <pre>/<textarea>).
+    """
+    return "\n".join(line.strip() for line in html.splitlines() if line.strip())
+
+
+_DASHBOARD_HTML: bytes = _minify_html(
+    _with_asset_versions(_DASHBOARD_HTML_SRC)
+).encode("utf-8")
+_DASHBOARD_ETAG = body_etag(_DASHBOARD_HTML)
+# Wersja skompresowana raz przy imporcie (GZipMiddleware pomija odpowiedzi,
+# które już mają Content-Encoding); osobny ETag dla tej reprezentacji.
+_DASHBOARD_HTML_GZ = gzip.compress(_DASHBOARD_HTML, compresslevel=9)
+_DASHBOARD_ETAG_GZ = _DASHBOARD_ETAG[:-1] + '-gz"'
 
 
 @app.get("/", response_class=HTMLResponse, tags=["dashboard"])
-def dashboard() -> str:
+async def dashboard(request: Request) -> Response:
     """
     Dashboard HTML:
     - lista agentów z risk score
     - niespełnione reguły + time-to-fix
     - historia skanów (trend risk score)
     - what-if dla wybranego frameworka
-    """
-    return """
-<!DOCTYPE html>
-<html lang="pl">
-<head>
-  <meta charset="UTF-8">
-  <title>NIS2 Dashboard</title>
-  <style>
-    body {
-      font-family: system-ui, -apple-system, BlinkMacSystemFont, "Segoe UI", sans-serif;
-      margin: 0;
-      padding: 0;
-      background: #f5f5f7;
-      color: #222;
-    }
-    header {
-      background: #111827;
-      color: #f9fafb;
-      padding: 1rem 1.5rem;
-    }
-    header h1 {
-      margin: 0;
-      font-size: 1.4rem;
-    }
-    main {
-      padding: 1.5rem;
-      display: grid;
-      grid-template-columns: 1.1fr 2.6fr;
-      gap: 1.5rem;
-    }
-    @media (max-width: 900px) {
-      main {
-        grid-template-columns: 1fr;
-      }
-    }
-    .card {
-      background: #ffffff;
-      border-radius: 0.5rem;
-      box-shadow: 0 1px 3px rgba(0,0,0,0.08);
-      padding: 1rem 1.25rem;
-    }
-    .card h2 {
-      margin-top: 0;
-      font-size: 1.1rem;
-      margin-bottom: 0.5rem;
-    }
-    table {
-      width: 100%;
-      border-collapse: collapse;
-      font-size: 0.9rem;
-    }
-    th, td {
-      padding: 0.4rem 0.5rem;
-      border-bottom: 1px solid #e5e7eb;
-      text-align: left;
-    }
-    th {
-      background: #f3f4f6;
-      font-weight: 600;
-    }
-    tr.clickable {
-      cursor: pointer;
-    }
-    tr.clickable:hover {
-      background: #f9fafb;
-    }
-    .badge {
-      display: inline-flex;
-      align-items: center;
-      padding: 0.05rem 0.35rem;
-      border-radius: 999px;
-      font-size: 0.7rem;
-      font-weight: 600;
-      text-transform: uppercase;
-      letter-spacing: 0.03em;
-    }
-    .badge-ok {
-      background: #dcfce7;
-      color: #166534;
-    }
-    .badge-failed {
-      background: #fee2e2;
-      color: #991b1b;
-    }
-    .badge-high {
-      background: #fee2e2;
-      color: #b91c1c;
-    }
-    .badge-medium {
-      background: #fef3c7;
-      color: #92400e;
-    }
-    .badge-low {
-      background: #e0f2fe;
-      color: #075985;
-    }
-    .badge-risk-low {
-      background: #dcfce7;
-      color: #166534;
-    }
-    .badge-risk-med {
-      background: #fef3c7;
-      color: #92400e;
-    }
-    .badge-risk-high {
-      background: #fee2e2;
-      color: #b91c1c;
-    }
-    .muted {
-      color: #6b7280;
-      font-size: 0.8rem;
-    }
-    .error {
-      color: #b91c1c;
-      font-size: 0.85rem;
-      margin-top: 0.25rem;
-    }
-    .pill {
-      display: inline-block;
-      font-size: 0.75rem;
-      padding: 0.1rem 0.35rem;
-      border-radius: 999px;
-      background: #f3f4f6;
-      color: #4b5563;
-      margin-right: 0.15rem;
-      margin-top: 0.1rem;
-    }
-    .section-header {
-      display: flex;
-      justify-content: space-between;
-      align-items: center;
-      margin-bottom: 0.4rem;
-      gap: 0.6rem;
-    }
-    button {
-      border-radius: 999px;
-      border: 1px solid #d1d5db;
-      padding: 0.2rem 0.7rem;
-      font-size: 0.8rem;
-      background: #ffffff;
-      cursor: pointer;
-    }
-    button:hover {
-      background: #f3f4f6;
-    }
-    #agents-error, #rules-error, #history-error, #whatif-error {
-      display: none;
-    }
-    .tabs {
-      display: flex;
-      gap: 0.5rem;
-      margin-bottom: 0.5rem;
-      flex-wrap: wrap;
-    }
-    .tab-btn {
-      padding: 0.2rem 0.7rem;
-      border-radius: 999px;
-      border: 1px solid #d1d5db;
-      background: #ffffff;
-      cursor: pointer;
-      font-size: 0.8rem;
-    }
-    .tab-btn.active {
-      background: #111827;
-      color: #f9fafb;
-      border-color: #111827;
-    }
-    .tab-content {
-      display: none;
-    }
-    .tab-content.active {
-      display: block;
-    }
-    #history-chart {
-      width: 100%;
-      height: 120px;
-    }
-    .status-badge {
-      display: inline-flex;
-      align-items: center;
-      padding: 0.05rem 0.35rem;
-      border-radius: 999px;
-      font-size: 0.7rem;
-      font-weight: 600;
-      text-transform: uppercase;
-      letter-spacing: 0.03em;
-    }
-    .status-passed {
-      background: #dcfce7;
-      color: #166534;
-    }
-    .status-failed {
-      background: #fee2e2;
-      color: #b91c1c;
-    }
-    .status-not-implemented {
-      background: #e5e7eb;
-      color: #374151;
-    }
-    select {
-      font-size: 0.8rem;
-      padding: 0.2rem 0.4rem;
-      border-radius: 999px;
-      border: 1px solid #d1d5db;
-      background: #fff;
-    }
-  </style>
-</head>
-<body>
-  <header>
-    <h1>NIS2 – dashboard agentów</h1>
-  </header>
-  <main>
-    <section class="card">
-      <div class="section-header">
-        <h2>Agenci</h2>
-        <button onclick="loadAgents()">Odśwież</button>
-      </div>
-      <p class="muted">Kliknij agenta, aby zobaczyć niespełnione reguły, historię i symulację what-if.</p>
-      <div id="agents-error" class="error"></div>
-      <table id="agents-table">
-        <thead>
-          <tr>
-            <th>ID agenta</th>
-            <th>Ostatni raport</th>
-            <th>Niespełnione reguły</th>
-            <th>Risk score</th>
-          </tr>
-        </thead>
-        <tbody>
-        </tbody>
-      </table>
-    </section>
-
-    <section class="card">
-      <div class="section-header">
-        <div>
-          <h2>Szczegóły agenta</h2>
-          <span id="selected-agent" class="muted">Brak wybranego agenta</span>
-        </div>
-        <div id="agent-risk" class="muted">Risk: -</div>
-      </div>
-
-      <div class="tabs">
-        <button class="tab-btn active" data-tab="rules-tab" onclick="switchTab('rules-tab')">Niespełnione reguły</button>
-        <button class="tab-btn" data-tab="history-tab" onclick="switchTab('history-tab')">Historia</button>
-        <button class="tab-btn" data-tab="whatif-tab" onclick="switchTab('whatif-tab')">What-if / Frameworks</button>
-      </div>
-
-      <div id="rules-error" class="error"></div>
-      <div id="history-error" class="error"></div>
-      <div id="whatif-error" class="error"></div>
-
-      <div id="rules-tab" class="tab-content active">
-        <table id="rules-table">
-          <thead>
-            <tr>
-              <th>Reguła</th>
-              <th>Opis</th>
-              <th>Poziom</th>
-              <th>Frameworki</th>
-              <th>Failing od</th>
-            </tr>
-          </thead>
-          <tbody>
-          </tbody>
-        </table>
-      </div>
-
-      <div id="history-tab" class="tab-content">
-        <svg id="history-chart"></svg>
-        <table id="history-table">
-          <thead>
-            <tr>
-              <th>Raport</th>
-              <th>Niespełnione / Wszystkie</th>
-              <th>Risk</th>
-            </tr>
-          </thead>
-          <tbody>
-          </tbody>
-        </table>
-      </div>
-
-      <div id="whatif-tab" class="tab-content">
-        <div class="section-header" style="margin-bottom:0.5rem;">
-          <span class="muted">Wybierz framework:</span>
-          <select id="framework-select" onchange="onFrameworkChange()">
-            <option value="">-- wybierz --</option>
-          </select>
-        </div>
-        <p id="whatif-summary" class="muted"></p>
-        <table id="whatif-table">
-          <thead>
-            <tr>
-              <th>Reguła</th>
-              <th>Severity</th>
-              <th>Status</th>
-              <th>Frameworki</th>
-            </tr>
-          </thead>
-          <tbody></tbody>
-        </table>
-      </div>
-    </section>
-  </main>
-
-  <script>
-    const apiBase = "";
-    let selectedAgentId = null;
-    let frameworksCache = [];
-
-    function switchTab(tabId) {
-      document.querySelectorAll(".tab-btn").forEach(btn => {
-        btn.classList.toggle("active", btn.dataset.tab === tabId);
-      });
-      document.querySelectorAll(".tab-content").forEach(div => {
-        div.classList.toggle("active", div.id === tabId);
-      });
-    }
-
-    function riskClass(score) {
-      if (score <= 0.0) return "badge-risk-low";
-      if (score < 50) return "badge-risk-med";
-      return "badge-risk-high";
-    }
-
-    async function loadAgents() {
-      const tbody = document.querySelector("#agents-table tbody");
-      const errorBox = document.getElementById("agents-error");
-      tbody.innerHTML = "";
-      errorBox.style.display = "none";
-      errorBox.textContent = "";
-
-      try {
-        const res = await fetch(apiBase + "/api/v1/agents");
-        if (!res.ok) {
-          throw new Error("HTTP " + res.status);
-        }
-        const list = await res.json();
-
-        if (!Array.isArray(list) || list.length === 0) {
-          const tr = document.createElement("tr");
-          const td = document.createElement("td");
-          td.colSpan = 4;
-          td.className = "muted";
-          td.textContent = "Brak agentów. Upewnij się, że agent wysłał co najmniej jeden raport.";
-          tr.appendChild(td);
-          tbody.appendChild(tr);
-          return;
-        }
-
-        list.forEach(agent => {
-          const tr = document.createElement("tr");
-          tr.className = "clickable";
-          tr.onclick = () => loadAgent(agent.agent_id);
-
-          const tdId = document.createElement("td");
-          tdId.textContent = agent.agent_id;
-
-          const tdLast = document.createElement("td");
-          tdLast.textContent = agent.last_report_at || "-";
-
-          const tdFailed = document.createElement("td");
-          const spanFailed = document.createElement("span");
-          if (agent.failed_rules_count && agent.failed_rules_count > 0) {
-            spanFailed.className = "badge badge-failed";
-            spanFailed.textContent = agent.failed_rules_count + " FAIL";
-          } else {
-            spanFailed.className = "badge badge-ok";
-            spanFailed.textContent = "OK";
-          }
-          tdFailed.appendChild(spanFailed);
-
-          const tdRisk = document.createElement("td");
-          const spanRisk = document.createElement("span");
-          const risk = agent.risk_score || 0;
-          spanRisk.className = "badge " + riskClass(risk);
-          spanRisk.textContent = risk.toFixed(1);
-          tdRisk.appendChild(spanRisk);
-
-          tr.appendChild(tdId);
-          tr.appendChild(tdLast);
-          tr.appendChild(tdFailed);
-          tr.appendChild(tdRisk);
-
-          tbody.appendChild(tr);
-        });
-      } catch (err) {
-        errorBox.style.display = "block";
-        errorBox.textContent = "Błąd ładowania listy agentów: " + err;
-      }
-    }
-
-    async function loadAgent(agentId) {
-      selectedAgentId = agentId;
-      const selected = document.getElementById("selected-agent");
-      selected.textContent = "Agent: " + agentId;
-
-      await Promise.all([
-        loadAgentDetails(agentId),
-        loadAgentHistory(agentId),
-        ensureFrameworksLoaded(),
-      ]);
-    }
-
-    async function loadAgentDetails(agentId) {
-      const tbody = document.querySelector("#rules-table tbody");
-      const errorBox = document.getElementById("rules-error");
-      const riskBox = document.getElementById("agent-risk");
-
-      tbody.innerHTML = "";
-      errorBox.style.display = "none";
-      errorBox.textContent = "";
-      riskBox.textContent = "Risk: -";
-
-      try {
-        const res = await fetch(apiBase + "/api/v1/agents/" + encodeURIComponent(agentId) + "/latest/enriched");
-        if (!res.ok) {
-          if (res.status === 404) {
-            const tr = document.createElement("tr");
-            const td = document.createElement("td");
-            td.colSpan = 5;
-            td.className = "muted";
-            td.textContent = "Brak raportów dla tego agenta.";
-            tr.appendChild(td);
-            tbody.appendChild(tr);
-            return;
-          }
-          throw new Error("HTTP " + res.status);
-        }
-        const summary = await res.json();
-        const failed = summary.failed_rules || [];
-        const meta = summary.failed_rules_meta || [];
-        const metaMap = new Map(meta.map(m => [m.rule_id, m]));
-
-        const risk = summary.risk_score || 0;
-        riskBox.textContent = "Risk: " + risk.toFixed(1);
-        riskBox.className = "badge " + riskClass(risk);
-
-        if (failed.length === 0) {
-          const tr = document.createElement("tr");
-          const td = document.createElement("td");
-          td.colSpan = 5;
-          td.className = "muted";
-          td.textContent = "Brak niespełnionych reguł w ostatnim raporcie.";
-          tr.appendChild(td);
-          tbody.appendChild(tr);
-          return;
-        }
-
-        failed.forEach(rule => {
-          const tr = document.createElement("tr");
-
-          const tdId = document.createElement("td");
-          tdId.textContent = rule.rule_id;
-
-          const tdDesc = document.createElement("td");
-          const pDesc = document.createElement("div");
-          pDesc.textContent = rule.description || "";
-          tdDesc.appendChild(pDesc);
-          if (rule.details) {
-            const pDetails = document.createElement("div");
-            pDetails.className = "muted";
-            pDetails.textContent = rule.details;
-            tdDesc.appendChild(pDetails);
-          }
-
-          const tdSev = document.createElement("td");
-          const sevSpan = document.createElement("span");
-          const sev = (rule.severity || "").toLowerCase();
-          if (sev === "high" || sev === "critical") {
-            sevSpan.className = "badge badge-high";
-          } else if (sev === "medium") {
-            sevSpan.className = "badge badge-medium";
-          } else {
-            sevSpan.className = "badge badge-low";
-          }
-          sevSpan.textContent = sev || "unknown";
-          tdSev.appendChild(sevSpan);
-
-          const tdFw = document.createElement("td");
-          const frameworks = rule.frameworks || [];
-          if (frameworks.length) {
-            frameworks.forEach(fw => {
-              const spanFw = document.createElement("span");
-              spanFw.className = "pill";
-              spanFw.textContent = fw;
-              tdFw.appendChild(spanFw);
-            });
-          } else {
-            const spanFw = document.createElement("span");
-            spanFw.className = "muted";
-            spanFw.textContent = "-";
-            tdFw.appendChild(spanFw);
-          }
-
-          const tdSince = document.createElement("td");
-          const m = metaMap.get(rule.rule_id);
-          if (m) {
-            tdSince.textContent = m.failing_since_report_timestamp + " (" + m.failing_scans + " skanów)";
-          } else {
-            tdSince.textContent = rule.timestamp || "-";
-          }
-
-          tr.appendChild(tdId);
-          tr.appendChild(tdDesc);
-          tr.appendChild(tdSev);
-          tr.appendChild(tdFw);
-          tr.appendChild(tdSince);
-
-          tbody.appendChild(tr);
-        });
-
-      } catch (err) {
-        errorBox.style.display = "block";
-        errorBox.textContent = "Błąd ładowania szczegółów agenta: " + err;
-      }
-    }
-
-    async function loadAgentHistory(agentId) {
-      const tbody = document.querySelector("#history-table tbody");
-      const errorBox = document.getElementById("history-error");
-      const svg = document.getElementById("history-chart");
-
-      tbody.innerHTML = "";
-      errorBox.style.display = "none";
-      errorBox.textContent = "";
-      svg.innerHTML = "";
-
-      try {
-        const res = await fetch(apiBase + "/api/v1/agents/" + encodeURIComponent(agentId) + "/history?limit=20");
-        if (!res.ok) {
-          throw new Error("HTTP " + res.status);
-        }
-        const history = await res.json();
-
-        if (!Array.isArray(history) || history.length === 0) {
-          const tr = document.createElement("tr");
-          const td = document.createElement("td");
-          td.colSpan = 3;
-          td.className = "muted";
-          td.textContent = "Brak historii raportów dla tego agenta.";
-          tr.appendChild(td);
-          tbody.appendChild(tr);
-          return;
-        }
 
-        history.forEach(point => {
-          const tr = document.createElement("tr");
-
-          const tdTs = document.createElement("td");
-          tdTs.textContent = point.report_timestamp;
-
-          const tdCounts = document.createElement("td");
-          tdCounts.textContent = point.failed_rules + " / " + point.total_rules;
-
-          const tdRisk = document.createElement("td");
-          const spanRisk = document.createElement("span");
-          const risk = point.risk_score || 0;
-          spanRisk.className = "badge " + riskClass(risk);
-          spanRisk.textContent = risk.toFixed(1);
-          tdRisk.appendChild(spanRisk);
-
-          tr.appendChild(tdTs);
-          tr.appendChild(tdCounts);
-          tr.appendChild(tdRisk);
-          tbody.appendChild(tr);
-        });
-
-        const w = svg.clientWidth || 600;
-        const h = svg.clientHeight || 120;
-        const padding = 10;
-
-        const maxRisk = history.reduce((max, p) => Math.max(max, p.risk_score || 0), 0) || 1;
-        const stepX = (w - 2 * padding) / Math.max(history.length - 1, 1);
-
-        let path = "";
-        history.forEach((p, idx) => {
-          const x = padding + idx * stepX;
-          const y = h - padding - ((p.risk_score || 0) / maxRisk) * (h - 2 * padding);
-          path += (idx === 0 ? "M" : " L") + x + " " + y;
-        });
-
-        svg.setAttribute("viewBox", `0 0 ${w} ${h}`);
-
-        const axis = document.createElementNS("http://www.w3.org/2000/svg", "line");
-        axis.setAttribute("x1", padding);
-        axis.setAttribute("y1", h - padding);
-        axis.setAttribute("x2", w - padding);
-        axis.setAttribute("y2", h - padding);
-        axis.setAttribute("stroke", "#d1d5db");
-        axis.setAttribute("stroke-width", "1");
-        svg.appendChild(axis);
-
-        const pathEl = document.createElementNS("http://www.w3.org/2000/svg", "path");
-        pathEl.setAttribute("d", path);
-        pathEl.setAttribute("fill", "none");
-        pathEl.setAttribute("stroke", "#111827");
-        pathEl.setAttribute("stroke-width", "1.5");
-        svg.appendChild(pathEl);
-
-      } catch (err) {
-        errorBox.style.display = "block";
-        errorBox.textContent = "Błąd ładowania historii agenta: " + err;
-      }
-    }
-
-    async function ensureFrameworksLoaded() {
-      if (frameworksCache.length > 0) return;
-
-      try {
-        const res = await fetch(apiBase + "/api/v1/frameworks");
-        if (!res.ok) {
-          throw new Error("HTTP " + res.status);
-        }
-        const list = await res.json();
-        frameworksCache = list || [];
-        const select = document.getElementById("framework-select");
-        frameworksCache.forEach(item => {
-          const opt = document.createElement("option");
-          opt.value = item.framework;
-          opt.textContent = item.framework + " (" + item.rules_count + ")";
-          select.appendChild(opt);
-        });
-      } catch (err) {
-        const errorBox = document.getElementById("whatif-error");
-        errorBox.style.display = "block";
-        errorBox.textContent = "Błąd ładowania frameworków: " + err;
-      }
-    }
-
-    function onFrameworkChange() {
-      const select = document.getElementById("framework-select");
-      const fw = select.value;
-      const summary = document.getElementById("whatif-summary");
-      const tbody = document.querySelector("#whatif-table tbody");
-      const errorBox = document.getElementById("whatif-error");
-
-      summary.textContent = "";
-      tbody.innerHTML = "";
-      errorBox.style.display = "none";
-      errorBox.textContent = "";
-
-      if (!selectedAgentId || !fw) {
-        return;
-      }
-      loadWhatIf(selectedAgentId, fw);
-    }
-
-    async function loadWhatIf(agentId, framework) {
-      const summary = document.getElementById("whatif-summary");
-      const tbody = document.querySelector("#whatif-table tbody");
-      const errorBox = document.getElementById("whatif-error");
-
-      tbody.innerHTML = "";
-      errorBox.style.display = "none";
-      errorBox.textContent = "";
-      summary.textContent = "Ładowanie what-if dla " + framework + "...";
-
-      try {
-        const res = await fetch(
-          apiBase + "/api/v1/agents/" + encodeURIComponent(agentId) +
-          "/what-if?framework=" + encodeURIComponent(framework)
-        );
-        if (!res.ok) {
-          throw new Error("HTTP " + res.status);
-        }
-        const data = await res.json();
-
-        summary.textContent =
-          "Framework " + data.framework +
-          ": passed=" + data.passed +
-          ", failed=" + data.failed +
-          ", not implemented=" + data.not_implemented +
-          " (łącznie " + data.total_rules + " reguł).";
-
-        if (!Array.isArray(data.rules) || data.rules.length === 0) {
-          const tr = document.createElement("tr");
-          const td = document.createElement("td");
-          td.colSpan = 4;
-          td.className = "muted";
-          td.textContent = "Brak reguł powiązanych z tym frameworkiem.";
-          tr.appendChild(td);
-          tbody.appendChild(tr);
-          return;
-        }
-
-        data.rules.forEach(r => {
-          const tr = document.createElement("tr");
-
-          const tdId = document.createElement("td");
-          tdId.textContent = r.id;
-
-          const tdSev = document.createElement("td");
-          const spanSev = document.createElement("span");
-          const sev = (r.severity || "").toLowerCase();
-          if (sev === "high" || sev === "critical") {
-            spanSev.className = "badge badge-high";
-          } else if (sev === "medium") {
-            spanSev.className = "badge badge-medium";
-          } else {
-            spanSev.className = "badge badge-low";
-          }
-          spanSev.textContent = sev || "unknown";
-          tdSev.appendChild(spanSev);
-
-          const tdStatus = document.createElement("td");
-          const spanStatus = document.createElement("span");
-          const status = r.status || "not_implemented";
-          if (status === "passed") spanStatus.className = "status-badge status-passed";
-          else if (status === "failed") spanStatus.className = "status-badge status-failed";
-          else spanStatus.className = "status-badge status-not-implemented";
-          spanStatus.textContent = status;
-          tdStatus.appendChild(spanStatus);
-
-          const tdFw = document.createElement("td");
-          const frameworks = r.frameworks || [];
-          if (frameworks.length) {
-            frameworks.forEach(fw => {
-              const spanFw = document.createElement("span");
-              spanFw.className = "pill";
-              spanFw.textContent = fw;
-              tdFw.appendChild(spanFw);
-            });
-          } else {
-            const spanFw = document.createElement("span");
-            spanFw.className = "muted";
-            spanFw.textContent = "-";
-            tdFw.appendChild(spanFw);
-          }
-
-          tr.appendChild(tdId);
-          tr.appendChild(tdSev);
-          tr.appendChild(tdStatus);
-          tr.appendChild(tdFw);
-
-          tbody.appendChild(tr);
-        });
-
-      } catch (err) {
-        summary.textContent = "";
-        errorBox.style.display = "block";
-        errorBox.textContent = "Błąd ładowania what-if: " + err;
-      }
-    }
-
-    window.addEventListener("DOMContentLoaded", () => {
-      loadAgents();
-      ensureFrameworksLoaded();
-    });
-  </script>
-</body>
-</html>
-"""
+    Treść jest stała – zakodowana do bajtów raz przy imporcie, z ETagiem.
+    """
+    if _accepts_gzip(request.headers.get("accept-encoding", "")):
+        body, etag = _DASHBOARD_HTML_GZ, _DASHBOARD_ETAG_GZ
+        headers = {"ETag": etag, "Content-Encoding": "gzip"}
+    else:
+        body, etag = _DASHBOARD_HTML, _DASHBOARD_ETAG
+        headers = {"ETag": etag}
+    headers["Vary"] = "Accept-Encoding"
+    headers["Cache-Control"] = "public, max-age=60"
+
+    if _etag_matches(request, etag):
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=body,
+        media_type="text/html; charset=utf-8",
+        headers=headers,
+    )
 
 
+# Celowo def, nie async: Starlette wykonuje taki endpoint w threadpoolu,
+# a rules_bundle() przy każdym wywołaniu sprawdza sygnaturę plików reguł
+# (scandir) i po ich zmianie parsuje YAML – nic z tego na pętli zdarzeń.
 @app.get("/api/v1/rules/bundle", tags=["rules"])
-def get_rules_bundle():
+def get_rules_bundle(request: Request):
     """
     Zwraca komplet reguł dla agenta:
     - version: hash reguł (do porównywania po stronie agenta)
     - rules: lista słowników z polami id/description/severity/condition/tags/frameworks
+
+    Odpowiedź niesie ETag równy wersji; przy zgodnym If-None-Match
+    zwracane jest 304 bez treści. Treść i wersja liczone są raz na zmianę
+    plików reguł (rules_catalog).
     """
-    rules_dir = BASE_DIR / "rules"
-
-    all_rules: list[dict] = []
-    if rules_dir.exists():
-        for path in sorted(rules_dir.glob("*.yml")):
-            data = path.read_text(encoding="utf-8")
-            parsed = yaml.safe_load(data) or []
-            if isinstance(parsed, list):
-                all_rules.extend(parsed)
-
-    raw_bytes = json.dumps(
-        all_rules,
-        sort_keys=True,
-        ensure_ascii=False,
-    ).encode("utf-8")
-    version = hashlib.sha256(raw_bytes).hexdigest()
-
-    return JSONResponse(
-        content={
-            "version": version,
-            "rules": all_rules,
-        }
-    )
\ No newline at end of file
+    version, body = rules_bundle()
+    # Gotowe bajty z rules_catalog idą bez ponownej serializacji; no-cache,
+    # żeby pośrednie cache zawsze rewalidowały ETagiem (304 bez treści)
+    headers = {"ETag": f'"{version}"', "Cache-Control": "no-cache"}
+
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    return _json_response(body, headers=headers)
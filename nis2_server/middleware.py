@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from typing import Any, Iterable
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+
+class PathPrefixMiddleware:
+    """
+    Uruchamia wskazany middleware tylko dla żądań HTTP, których ścieżka
+    zaczyna się od jednego z `prefixes` i nie zaczyna od żadnego
+    z `exclude_prefixes`; pozostałe trafiają prosto do aplikacji
+    (np. pobieranie EXE czy dashboard omijają CORS).
+
+    app.add_middleware(
+        PathPrefixMiddleware,
+        wrapped_class=CORSMiddleware,
+        prefixes=("/api/",),
+        allow_origins=["*"],
+    )
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        wrapped_class: Any,
+        prefixes: Iterable[str],
+        exclude_prefixes: Iterable[str] = (),
+        **options: Any,
+    ) -> None:
+        self.app = app
+        self.wrapped = wrapped_class(app, **options)
+        self.prefixes = tuple(prefixes)
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] == "http"
+            and scope["path"].startswith(self.prefixes)
+            and not scope["path"].startswith(self.exclude_prefixes)
+        ):
+            await self.wrapped(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ScanModel(BaseModel):
@@ -41,6 +41,9 @@ class RuleDefinition(BaseModel):
 
 
 class AgentSummary(BaseModel):
+    # Tylko do odczytu – instancje są współdzielone przez cache w storage
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     agent_id: str
     last_report_at: Optional[str] = None
     failed_rules_count: int = 0
@@ -48,12 +51,23 @@ class AgentSummary(BaseModel):
 
 
 class ReportSummary(BaseModel):
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     agent_id: str
     report_timestamp: str
     hostname: str
     failed_rules: List[RuleResultModel]
 
 
+class AgentSummaryWithLatest(AgentSummary):
+    latest: Optional[ReportSummary] = None
+
+
+class DashboardData(BaseModel):
+    agents: List[AgentSummary]
+    latest_by_agent: Dict[str, ReportSummary]
+
+
 class AgentConfig(BaseModel):
     agent_id: str
     scan_interval_seconds: int = Field(
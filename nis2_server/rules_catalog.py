@@ -1,42 +1,179 @@
 from __future__ import annotations
 
-from pathlib import Path
-from typing import Dict, List
+import hashlib
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
 
+import orjson
 import yaml
 
+try:
+    # Parser C (libyaml) – kilkukrotnie szybszy od czystego Pythona
+    from yaml import CSafeLoader as _LOADER
+except ImportError:  # pyyaml zbudowany bez libyaml
+    from yaml import SafeLoader as _LOADER
+
 from .config import BASE_DIR
 from .models import RuleDefinition
 
 RULES_DIR = BASE_DIR / "rules"
 
 
+@dataclass(frozen=True)
+class _CatalogSnapshot:
+    signature: tuple
+    rules: List[RuleDefinition]
+    index: Dict[str, List[RuleDefinition]]
+    frameworks: List[Dict[str, Any]]
+    # /api/v1/rules/bundle: wersja (sha256) i gotowe bajty odpowiedzi
+    bundle_version: str
+    bundle_body: bytes
+
+
+@dataclass(frozen=True)
+class _RuleFile:
+    stamp: Tuple[int, int]
+    rules: List[RuleDefinition]
+    # Reguły pliku jako JSON (posortowane klucze) bez otaczających [ ] –
+    # bundle skleja fragmenty zamiast serializować wszystko od nowa
+    fragment: bytes
+
+
+# nazwa pliku -> sparsowany plik reguł; po zmianie jednego pliku pozostałe
+# nie są ponownie parsowane ani serializowane
+_file_cache: Dict[str, _RuleFile] = {}
+
+# Katalog z pochodnymi (indeks, lista frameworków) liczony raz – parsujemy
+# YAML ponownie tylko wtedy, gdy zmieni się któryś plik reguł.
+_catalog_lock = threading.Lock()
+_catalog: Optional[_CatalogSnapshot] = None
+
+
+def _rules_signature() -> tuple:
+    """
+    (nazwa, mtime_ns, rozmiar) plików *.yml w katalogu reguł – kilka stat()
+    zamiast parsowania YAML przy każdym żądaniu.
+    """
+    entries = []
+    try:
+        with os.scandir(RULES_DIR) as it:
+            for e in it:
+                if e.name.endswith(".yml") and e.is_file():
+                    # jeden stat na plik – spójne mtime i rozmiar
+                    st = e.stat()
+                    entries.append((e.name, st.st_mtime_ns, st.st_size))
+    except FileNotFoundError:
+        return ()
+    return tuple(sorted(entries))
+
+
+def _snapshot() -> _CatalogSnapshot:
+    global _catalog, _file_cache
+    signature = _rules_signature()
+    cached = _catalog
+    if cached is not None and cached.signature == signature:
+        return cached
+
+    with _catalog_lock:
+        cached = _catalog
+        if cached is not None and cached.signature == signature:
+            return cached
+        files = [_rule_file(name, mtime_ns, size) for name, mtime_ns, size in signature]
+        _file_cache = {entry[0]: f for entry, f in zip(signature, files)}
+        rules = [r for f in files for r in f.rules]
+        index = _build_framework_index(rules)
+        # Sklejone fragmenty to dokładnie orjson.dumps(wszystkie_reguły, OPT_SORT_KEYS)
+        rules_json = b"[" + b",".join(f.fragment for f in files if f.fragment) + b"]"
+        version = hashlib.sha256(rules_json).hexdigest()
+        _catalog = _CatalogSnapshot(
+            signature=signature,
+            rules=rules,
+            index=index,
+            frameworks=[
+                {"framework": fw, "rules_count": len(rs)}
+                for fw, rs in sorted(index.items())
+            ],
+            bundle_version=version,
+            bundle_body=b'{"version":"' + version.encode("ascii") + b'","rules":'
+            + rules_json
+            + b"}",
+        )
+        return _catalog
+
+
 def load_rules_catalog() -> List[RuleDefinition]:
-    rules: List[RuleDefinition] = []
-    if not RULES_DIR.exists():
-        return rules
-
-    for path in sorted(RULES_DIR.glob("*.yml")):
-        with path.open("r", encoding="utf-8") as f:
-            data = yaml.safe_load(f) or []
-        if not isinstance(data, list):
-            continue
-        for item in data:
-            rules.append(
-                RuleDefinition(
-                    id=item["id"],
-                    description=item.get("description", ""),
-                    severity=item.get("severity", "low"),
-                    tags=(item.get("tags") or []),
-                    frameworks=(item.get("frameworks") or []),
-                )
-            )
-    return rules
+    """
+    Katalog reguł z rules/*.yml, cache'owany do czasu zmiany plików.
+    Zwracana lista jest współdzielona – nie należy jej modyfikować.
+    """
+    return _snapshot().rules
+
+
+def get_frameworks_summary() -> List[Dict[str, Any]]:
+    """
+    Posortowana lista {"framework", "rules_count"} – liczona razem
+    z katalogiem, nie przy każdym żądaniu.
+    """
+    return _snapshot().frameworks
+
+
+def get_rules_bundle() -> Tuple[str, bytes]:
+    """
+    (wersja, bajty JSON) kompletu reguł dla agentów – {"version", "rules"}
+    z surowymi definicjami z YAML (razem z condition).
+    """
+    snapshot = _snapshot()
+    return snapshot.bundle_version, snapshot.bundle_body
+
+
+def _rule_file(name: str, mtime_ns: int, size: int) -> _RuleFile:
+    """
+    Jeden plik rules/*.yml – parsowany tylko, gdy zmienił się jego
+    (mtime_ns, rozmiar). Wołane pod _catalog_lock.
+    """
+    stamp = (mtime_ns, size)
+    cached = _file_cache.get(name)
+    if cached is not None and cached.stamp == stamp:
+        return cached
+
+    with (RULES_DIR / name).open("r", encoding="utf-8") as f:
+        data = yaml.load(f, Loader=_LOADER) or []
+    raw = data if isinstance(data, list) else []
+    return _RuleFile(
+        stamp=stamp,
+        rules=[_rule_definition(item) for item in raw],
+        fragment=orjson.dumps(raw, option=orjson.OPT_SORT_KEYS)[1:-1],
+    )
+
+
+def _rule_definition(item: Dict[str, Any]) -> RuleDefinition:
+    return RuleDefinition(
+        id=item["id"],
+        description=item.get("description", ""),
+        severity=item.get("severity", "low"),
+        tags=(item.get("tags") or []),
+        frameworks=(item.get("frameworks") or []),
+    )
 
 
 def get_framework_index(rules: List[RuleDefinition]) -> Dict[str, List[RuleDefinition]]:
+    """
+    Indeks framework -> reguły. Dla listy z load_rules_catalog() zwracany
+    jest indeks policzony razem z katalogiem.
+    """
+    cached = _catalog
+    if cached is not None and rules is cached.rules:
+        return cached.index
+    return _build_framework_index(rules)
+
+
+def _build_framework_index(
+    rules: List[RuleDefinition],
+) -> Dict[str, List[RuleDefinition]]:
     index: Dict[str, List[RuleDefinition]] = {}
     for r in rules:
         for fw in r.frameworks:
             index.setdefault(fw, []).append(r)
-    return index
\ No newline at end of file
+    return index
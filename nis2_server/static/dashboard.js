@@ -0,0 +1,563 @@
+const apiBase = "";
+let selectedAgentId = null;
+let frameworksCache = [];
+let latestByAgent = {};
+// What-if wszystkich frameworków dla wybranego agenta: { agentId, promise }
+let whatIfAll = null;
+const agentRows = new Map();
+// Zapytania w locie współdzielone per URL: szybkie ponowne kliknięcia
+// czekają na tę samą odpowiedź zamiast wysyłać kolejne.
+const inflight = new Map();
+
+class HttpError extends Error {
+  constructor(status) {
+    super("HTTP " + status);
+    this.status = status;
+  }
+}
+
+function fetchJson(path) {
+  const url = apiBase + path;
+  if (inflight.has(url)) return inflight.get(url);
+  const promise = fetch(url)
+    .then(res => {
+      if (!res.ok) {
+        throw new HttpError(res.status);
+      }
+      return res.json();
+    })
+    .finally(() => inflight.delete(url));
+  inflight.set(url, promise);
+  return promise;
+}
+
+function switchTab(tabId) {
+  document.querySelectorAll(".tab-btn").forEach(btn => {
+    btn.classList.toggle("active", btn.dataset.tab === tabId);
+  });
+  document.querySelectorAll(".tab-content").forEach(div => {
+    div.classList.toggle("active", div.id === tabId);
+  });
+}
+
+function riskClass(score) {
+  if (score <= 0.0) return "badge-risk-low";
+  if (score < 50) return "badge-risk-med";
+  return "badge-risk-high";
+}
+
+async function loadAgents() {
+  const tbody = document.querySelector("#agents-table tbody");
+  const errorBox = document.getElementById("agents-error");
+  tbody.innerHTML = "";
+  agentRows.clear();
+  errorBox.style.display = "none";
+  errorBox.textContent = "";
+
+  try {
+    const data = await fetchJson("/api/v1/dashboard");
+    const list = data.agents;
+    latestByAgent = data.latest_by_agent || {};
+
+    if (!Array.isArray(list) || list.length === 0) {
+      const tr = document.createElement("tr");
+      const td = document.createElement("td");
+      td.colSpan = 4;
+      td.className = "muted";
+      td.textContent = "Brak agentów. Upewnij się, że agent wysłał co najmniej jeden raport.";
+      tr.appendChild(td);
+      tbody.appendChild(tr);
+      return;
+    }
+
+    const frag = document.createDocumentFragment();
+    list.forEach(agent => {
+      const tr = buildAgentRow(agent);
+      agentRows.set(agent.agent_id, tr);
+      frag.appendChild(tr);
+    });
+    tbody.appendChild(frag);
+  } catch (err) {
+    errorBox.style.display = "block";
+    errorBox.textContent = "Błąd ładowania listy agentów: " + err;
+  }
+}
+
+function buildAgentRow(agent) {
+  const tr = document.createElement("tr");
+  tr.className = "clickable";
+  tr.onclick = () => loadAgent(agent.agent_id);
+
+  const tdId = document.createElement("td");
+  tdId.textContent = agent.agent_id;
+
+  const tdLast = document.createElement("td");
+  tdLast.textContent = agent.last_report_at || "-";
+
+  const tdFailed = document.createElement("td");
+  const spanFailed = document.createElement("span");
+  if (agent.failed_rules_count && agent.failed_rules_count > 0) {
+    spanFailed.className = "badge badge-failed";
+    spanFailed.textContent = agent.failed_rules_count + " FAIL";
+  } else {
+    spanFailed.className = "badge badge-ok";
+    spanFailed.textContent = "OK";
+  }
+  tdFailed.appendChild(spanFailed);
+
+  const tdRisk = document.createElement("td");
+  const spanRisk = document.createElement("span");
+  const risk = agent.risk_score || 0;
+  spanRisk.className = "badge " + riskClass(risk);
+  spanRisk.textContent = risk.toFixed(1);
+  tdRisk.appendChild(spanRisk);
+
+  tr.appendChild(tdId);
+  tr.appendChild(tdLast);
+  tr.appendChild(tdFailed);
+  tr.appendChild(tdRisk);
+  return tr;
+}
+
+function applyAgentUpdate(agent) {
+  // Ostatni raport z /api/v1/dashboard jest już nieaktualny dla tego agenta
+  delete latestByAgent[agent.agent_id];
+
+  const tbody = document.querySelector("#agents-table tbody");
+  const tr = buildAgentRow(agent);
+  const existing = agentRows.get(agent.agent_id);
+  if (existing) {
+    existing.replaceWith(tr);
+  } else {
+    if (agentRows.size === 0) {
+      tbody.innerHTML = "";
+    }
+    tbody.appendChild(tr);
+  }
+  agentRows.set(agent.agent_id, tr);
+
+  if (agent.agent_id === selectedAgentId) {
+    loadAgent(agent.agent_id);
+  }
+}
+
+function subscribeAgentEvents() {
+  if (window.WebSocket) {
+    subscribeAgentSocket();
+  } else if (window.EventSource) {
+    subscribeAgentStream();
+  }
+}
+
+function subscribeAgentSocket() {
+  // Po zerwaniu łączymy się ponownie z rosnącym opóźnieniem (max 30 s),
+  // a po powrocie przeładowujemy listę, żeby nie zgubić zdarzeń z przerwy.
+  // Jeśli WebSocket nie zadziała ani razu (np. proxy go nie przepuszcza),
+  // przechodzimy na SSE.
+  const url = new URL(apiBase + "/ws/dashboard", window.location.href);
+  url.protocol = url.protocol === "https:" ? "wss:" : "ws:";
+  let delay = 1000;
+  let everOpened = false;
+  let wasDown = false;
+
+  function connect() {
+    const socket = new WebSocket(url);
+    socket.onopen = () => {
+      everOpened = true;
+      delay = 1000;
+      if (wasDown) {
+        wasDown = false;
+        loadAgents();
+      }
+    };
+    socket.onmessage = ev => applyAgentUpdate(JSON.parse(ev.data));
+    socket.onclose = () => {
+      if (!everOpened && window.EventSource) {
+        subscribeAgentStream();
+        return;
+      }
+      wasDown = true;
+      setTimeout(connect, delay);
+      delay = Math.min(delay * 2, 30000);
+    };
+  }
+
+  connect();
+}
+
+function subscribeAgentStream() {
+  // EventSource sam wznawia połączenie; po przerwie przeładowujemy listę,
+  // żeby nie zgubić zdarzeń z czasu rozłączenia.
+  let wasDown = false;
+  const source = new EventSource(apiBase + "/api/v1/stream");
+  source.addEventListener("agent", ev => applyAgentUpdate(JSON.parse(ev.data)));
+  source.onerror = () => { wasDown = true; };
+  source.onopen = () => {
+    if (wasDown) {
+      wasDown = false;
+      loadAgents();
+    }
+  };
+}
+
+async function loadAgent(agentId) {
+  selectedAgentId = agentId;
+  whatIfAll = null;
+  const selected = document.getElementById("selected-agent");
+  selected.textContent = "Agent: " + agentId;
+
+  await Promise.all([
+    loadAgentDetails(agentId),
+    loadAgentHistory(agentId),
+    ensureFrameworksLoaded(),
+  ]);
+  // Wybrany framework pokazywał dane poprzedniego agenta / raportu
+  onFrameworkChange();
+}
+
+async function loadAgentDetails(agentId) {
+  const tbody = document.querySelector("#rules-table tbody");
+  const errorBox = document.getElementById("rules-error");
+  const riskBox = document.getElementById("agent-risk");
+
+  tbody.innerHTML = "";
+  errorBox.style.display = "none";
+  errorBox.textContent = "";
+  riskBox.textContent = "Risk: -";
+
+  // Ostatni raport jest już w danych z /api/v1/dashboard – pokaż go od razu,
+  // risk i time-to-fix dociągnie wersja enriched.
+  const cached = latestByAgent[agentId];
+  if (cached) {
+    renderFailedRules(tbody, cached.failed_rules || [], new Map());
+  }
+
+  try {
+    const summary = await fetchJson("/api/v1/agents/" + encodeURIComponent(agentId) + "/latest/enriched");
+    const failed = summary.failed_rules || [];
+    const meta = summary.failed_rules_meta || [];
+    const metaMap = new Map(meta.map(m => [m.rule_id, m]));
+
+    const risk = summary.risk_score || 0;
+    riskBox.textContent = "Risk: " + risk.toFixed(1);
+    riskBox.className = "badge " + riskClass(risk);
+
+    renderFailedRules(tbody, failed, metaMap);
+  } catch (err) {
+    if (err.status === 404) {
+      tbody.innerHTML = "";
+      const tr = document.createElement("tr");
+      const td = document.createElement("td");
+      td.colSpan = 5;
+      td.className = "muted";
+      td.textContent = "Brak raportów dla tego agenta.";
+      tr.appendChild(td);
+      tbody.appendChild(tr);
+      return;
+    }
+    errorBox.style.display = "block";
+    errorBox.textContent = "Błąd ładowania szczegółów agenta: " + err;
+  }
+}
+
+function renderFailedRules(tbody, failed, metaMap) {
+  tbody.innerHTML = "";
+  if (failed.length === 0) {
+    const tr = document.createElement("tr");
+    const td = document.createElement("td");
+    td.colSpan = 5;
+    td.className = "muted";
+    td.textContent = "Brak niespełnionych reguł w ostatnim raporcie.";
+    tr.appendChild(td);
+    tbody.appendChild(tr);
+    return;
+  }
+
+  const frag = document.createDocumentFragment();
+  failed.forEach(rule => {
+    const tr = document.createElement("tr");
+
+    const tdId = document.createElement("td");
+    tdId.textContent = rule.rule_id;
+
+    const tdDesc = document.createElement("td");
+    const pDesc = document.createElement("div");
+    pDesc.textContent = rule.description || "";
+    tdDesc.appendChild(pDesc);
+    if (rule.details) {
+      const pDetails = document.createElement("div");
+      pDetails.className = "muted";
+      pDetails.textContent = rule.details;
+      tdDesc.appendChild(pDetails);
+    }
+
+    const tdSev = document.createElement("td");
+    const sevSpan = document.createElement("span");
+    const sev = (rule.severity || "").toLowerCase();
+    if (sev === "high" || sev === "critical") {
+      sevSpan.className = "badge badge-high";
+    } else if (sev === "medium") {
+      sevSpan.className = "badge badge-medium";
+    } else {
+      sevSpan.className = "badge badge-low";
+    }
+    sevSpan.textContent = sev || "unknown";
+    tdSev.appendChild(sevSpan);
+
+    const tdFw = document.createElement("td");
+    const frameworks = rule.frameworks || [];
+    if (frameworks.length) {
+      frameworks.forEach(fw => {
+        const spanFw = document.createElement("span");
+        spanFw.className = "pill";
+        spanFw.textContent = fw;
+        tdFw.appendChild(spanFw);
+      });
+    } else {
+      const spanFw = document.createElement("span");
+      spanFw.className = "muted";
+      spanFw.textContent = "-";
+      tdFw.appendChild(spanFw);
+    }
+
+    const tdSince = document.createElement("td");
+    const m = metaMap.get(rule.rule_id);
+    if (m) {
+      tdSince.textContent = m.failing_since_report_timestamp + " (" + m.failing_scans + " skanów)";
+    } else {
+      tdSince.textContent = rule.timestamp || "-";
+    }
+
+    tr.appendChild(tdId);
+    tr.appendChild(tdDesc);
+    tr.appendChild(tdSev);
+    tr.appendChild(tdFw);
+    tr.appendChild(tdSince);
+
+    frag.appendChild(tr);
+  });
+  tbody.appendChild(frag);
+}
+
+async function loadAgentHistory(agentId) {
+  const tbody = document.querySelector("#history-table tbody");
+  const errorBox = document.getElementById("history-error");
+  const chart = document.getElementById("history-chart");
+
+  tbody.innerHTML = "";
+  errorBox.style.display = "none";
+  errorBox.textContent = "";
+  chart.hidden = true;
+
+  try {
+    const history = await fetchJson("/api/v1/agents/" + encodeURIComponent(agentId) + "/history?limit=20");
+
+    if (!Array.isArray(history) || history.length === 0) {
+      const tr = document.createElement("tr");
+      const td = document.createElement("td");
+      td.colSpan = 3;
+      td.className = "muted";
+      td.textContent = "Brak historii raportów dla tego agenta.";
+      tr.appendChild(td);
+      tbody.appendChild(tr);
+      return;
+    }
+
+    const frag = document.createDocumentFragment();
+    history.forEach(point => {
+      const tr = document.createElement("tr");
+
+      const tdTs = document.createElement("td");
+      tdTs.textContent = point.report_timestamp;
+
+      const tdCounts = document.createElement("td");
+      tdCounts.textContent = point.failed_rules + " / " + point.total_rules;
+
+      const tdRisk = document.createElement("td");
+      const spanRisk = document.createElement("span");
+      const risk = point.risk_score || 0;
+      spanRisk.className = "badge " + riskClass(risk);
+      spanRisk.textContent = risk.toFixed(1);
+      tdRisk.appendChild(spanRisk);
+
+      tr.appendChild(tdTs);
+      tr.appendChild(tdCounts);
+      tr.appendChild(tdRisk);
+      frag.appendChild(tr);
+    });
+    tbody.appendChild(frag);
+
+    // Wykres generuje serwer (SVG cache'owany per agent); znacznik ostatniego
+    // raportu w URL wymusza nowy obrazek dopiero po nowym skanie.
+    const last = history[history.length - 1];
+    chart.src = apiBase + "/api/v1/agents/" + encodeURIComponent(agentId) +
+      "/history/sparkline.svg?limit=20&v=" + encodeURIComponent(last.report_timestamp);
+    chart.hidden = false;
+  } catch (err) {
+    errorBox.style.display = "block";
+    errorBox.textContent = "Błąd ładowania historii agenta: " + err;
+  }
+}
+
+async function ensureFrameworksLoaded() {
+  if (frameworksCache.length > 0) return;
+
+  try {
+    const list = await fetchJson("/api/v1/frameworks");
+    // Równoległe wywołanie (start strony + kliknięcie agenta) mogło już
+    // wypełnić select tą samą odpowiedzią
+    if (frameworksCache.length > 0) return;
+    frameworksCache = list || [];
+    const select = document.getElementById("framework-select");
+    const frag = document.createDocumentFragment();
+    frameworksCache.forEach(item => {
+      const opt = document.createElement("option");
+      opt.value = item.framework;
+      opt.textContent = item.framework + " (" + item.rules_count + ")";
+      frag.appendChild(opt);
+    });
+    select.appendChild(frag);
+  } catch (err) {
+    const errorBox = document.getElementById("whatif-error");
+    errorBox.style.display = "block";
+    errorBox.textContent = "Błąd ładowania frameworków: " + err;
+  }
+}
+
+function onFrameworkChange() {
+  const select = document.getElementById("framework-select");
+  const fw = select.value;
+  const summary = document.getElementById("whatif-summary");
+  const tbody = document.querySelector("#whatif-table tbody");
+  const errorBox = document.getElementById("whatif-error");
+
+  summary.textContent = "";
+  tbody.innerHTML = "";
+  errorBox.style.display = "none";
+  errorBox.textContent = "";
+
+  if (!selectedAgentId || !fw) {
+    return;
+  }
+  loadWhatIf(selectedAgentId, fw);
+}
+
+function loadWhatIfAll(agentId) {
+  // Jedno zapytanie o wszystkie frameworki na agenta; zmiana frameworka
+  // w select korzysta już z pobranych danych.
+  if (!whatIfAll || whatIfAll.agentId !== agentId) {
+    const promise = fetchJson("/api/v1/agents/" + encodeURIComponent(agentId) + "/what-if/all");
+    whatIfAll = { agentId, promise };
+    promise.catch(() => {
+      if (whatIfAll && whatIfAll.promise === promise) whatIfAll = null;
+    });
+  }
+  return whatIfAll.promise;
+}
+
+async function loadWhatIf(agentId, framework) {
+  const summary = document.getElementById("whatif-summary");
+  const tbody = document.querySelector("#whatif-table tbody");
+  const errorBox = document.getElementById("whatif-error");
+
+  tbody.innerHTML = "";
+  errorBox.style.display = "none";
+  errorBox.textContent = "";
+  summary.textContent = "Ładowanie what-if dla " + framework + "...";
+
+  try {
+    const all = await loadWhatIfAll(agentId);
+    // Użytkownik mógł w międzyczasie wybrać innego agenta lub framework
+    if (agentId !== selectedAgentId ||
+        framework !== document.getElementById("framework-select").value) {
+      return;
+    }
+    const data = all[framework] || {
+      framework: framework, passed: 0, failed: 0, not_implemented: 0,
+      total_rules: 0, rules: [],
+    };
+
+    summary.textContent =
+      "Framework " + data.framework +
+      ": passed=" + data.passed +
+      ", failed=" + data.failed +
+      ", not implemented=" + data.not_implemented +
+      " (łącznie " + data.total_rules + " reguł).";
+
+    if (!Array.isArray(data.rules) || data.rules.length === 0) {
+      const tr = document.createElement("tr");
+      const td = document.createElement("td");
+      td.colSpan = 4;
+      td.className = "muted";
+      td.textContent = "Brak reguł powiązanych z tym frameworkiem.";
+      tr.appendChild(td);
+      tbody.appendChild(tr);
+      return;
+    }
+
+    const frag = document.createDocumentFragment();
+    data.rules.forEach(r => {
+      const tr = document.createElement("tr");
+
+      const tdId = document.createElement("td");
+      tdId.textContent = r.id;
+
+      const tdSev = document.createElement("td");
+      const spanSev = document.createElement("span");
+      const sev = (r.severity || "").toLowerCase();
+      if (sev === "high" || sev === "critical") {
+        spanSev.className = "badge badge-high";
+      } else if (sev === "medium") {
+        spanSev.className = "badge badge-medium";
+      } else {
+        spanSev.className = "badge badge-low";
+      }
+      spanSev.textContent = sev || "unknown";
+      tdSev.appendChild(spanSev);
+
+      const tdStatus = document.createElement("td");
+      const spanStatus = document.createElement("span");
+      const status = r.status || "not_implemented";
+      if (status === "passed") spanStatus.className = "status-badge status-passed";
+      else if (status === "failed") spanStatus.className = "status-badge status-failed";
+      else spanStatus.className = "status-badge status-not-implemented";
+      spanStatus.textContent = status;
+      tdStatus.appendChild(spanStatus);
+
+      const tdFw = document.createElement("td");
+      const frameworks = r.frameworks || [];
+      if (frameworks.length) {
+        frameworks.forEach(fw => {
+          const spanFw = document.createElement("span");
+          spanFw.className = "pill";
+          spanFw.textContent = fw;
+          tdFw.appendChild(spanFw);
+        });
+      } else {
+        const spanFw = document.createElement("span");
+        spanFw.className = "muted";
+        spanFw.textContent = "-";
+        tdFw.appendChild(spanFw);
+      }
+
+      tr.appendChild(tdId);
+      tr.appendChild(tdSev);
+      tr.appendChild(tdStatus);
+      tr.appendChild(tdFw);
+
+      frag.appendChild(tr);
+    });
+    tbody.appendChild(frag);
+
+  } catch (err) {
+    summary.textContent = "";
+    errorBox.style.display = "block";
+    errorBox.textContent = "Błąd ładowania what-if: " + err;
+  }
+}
+
+window.addEventListener("DOMContentLoaded", () => {
+  loadAgents();
+  ensureFrameworksLoaded();
+  subscribeAgentEvents();
+});
@@ -1,30 +1,75 @@
 from __future__ import annotations
 
+import bisect
 import datetime as dt
-import json
+import functools
+import itertools
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
 
+import orjson
+
+from .cache import TTLCache
 from .config import AGENTS_DIR
 from .models import (
     AgentReportCreate,
     AgentSummary,
+    AgentSummaryWithLatest,
+    DashboardData,
     ReportSummary,
     RuleResultModel,
     AgentConfig,
     ReportHistoryPoint,
     RuleTimeMeta,
     ReportSummaryEnriched,
+    RuleDefinition,
     WhatIfResult,
     WhatIfRuleStatus,
 )
 from .rules_catalog import load_rules_catalog, get_framework_index
 
 
+# Dashboard odpytuje listę agentów i ostatnie raporty w kółko; krótki TTL
+# ogranicza nieaktualność (np. ręczna zmiana config.json), a persist_report
+# unieważnia wpisy danego agenta od razu.
+_CACHE_TTL_SECONDS = 2.0
+_MISSING = object()
+_agents_cache = TTLCache(ttl=_CACHE_TTL_SECONDS, maxsize=1)
+_latest_cache = TTLCache(ttl=_CACHE_TTL_SECONDS, maxsize=1024)
+
+
+def _dumps(obj) -> bytes:
+    # Format plików na dysku: wcięcie 2 i posortowane klucze (stabilne diffy)
+    return orjson.dumps(
+        obj,
+        option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+    )
+
+
+_loads = orjson.loads
+
+
+def _invalidate_agent_cache(agent_id: str) -> None:
+    _agents_cache.clear()
+    _latest_cache.pop(agent_id)
+
+
+# Katalogi agentów już utworzone w tym procesie – bez mkdir przy każdym odczycie
+_ensured: set[str] = set()
+
+
 def _agent_dir(agent_id: str) -> Path:
     d = AGENTS_DIR / agent_id
-    d.mkdir(parents=True, exist_ok=True)
-    (d / "reports").mkdir(parents=True, exist_ok=True)
+    if agent_id not in _ensured:
+        (d / "reports").mkdir(parents=True, exist_ok=True)
+        _ensured.add(agent_id)
     return d
 
 
@@ -32,98 +77,288 @@ def _index_path(agent_id: str) -> Path:
     return _agent_dir(agent_id) / "index.json"
 
 
+@dataclass
+class _IndexHandle:
+    path: Path
+    data: Dict
+    dirty: bool = False
+
+
+# agent_id -> ((mtime_ns, size), sparsowany index.json) – kolejne odczyty
+# niezmienionego pliku nie parsują go ponownie
+_index_cache: Dict[str, Tuple[Tuple[int, int], Dict]] = {}
+# Read-modify-write indeksu (persist_report w tle) nie może się przeplatać
+_index_write_lock = threading.Lock()
+
+
 def _load_index(agent_id: str) -> Dict:
+    """
+    index.json tylko do odczytu. Zwracany dict jest współdzielony między
+    wywołaniami, dopóki plik się nie zmieni – nie wolno go modyfikować
+    (do zapisu służy _open_index).
+    """
     path = _index_path(agent_id)
-    if not path.exists():
+    try:
+        st = path.stat()
+    except FileNotFoundError:
         return {"agent_id": agent_id, "reports": []}
-    with path.open("r", encoding="utf-8") as f:
-        data = json.load(f)
+    key = (st.st_mtime_ns, st.st_size)
+    cached = _index_cache.get(agent_id)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    data = _parse_index(agent_id, path.read_bytes())
+    _index_cache[agent_id] = (key, data)
+    return data
+
+
+@contextmanager
+def _open_index(agent_id: str) -> Iterator[_IndexHandle]:
+    """
+    Jeden read-modify-write indeksu: świeży odczyt z dysku na wejściu,
+    zapis (atomowo, przez plik tymczasowy) na wyjściu tylko gdy dirty.
+    """
+    path = _index_path(agent_id)
+    with _index_write_lock:
+        if path.exists():
+            data = _parse_index(agent_id, path.read_bytes())
+        else:
+            data = {"agent_id": agent_id, "reports": []}
+        handle = _IndexHandle(path=path, data=data)
+        yield handle
+        if handle.dirty:
+            tmp_path = path.with_suffix(".json.tmp")
+            tmp_path.write_bytes(_dumps(handle.data))
+            os.replace(tmp_path, path)
+
+
+def _parse_index(agent_id: str, raw: bytes) -> Dict:
+    data = _loads(raw)
     if "reports" not in data:
         data["reports"] = []
+    for entry in data["reports"]:
+        if "risk_base" not in entry or "total_rules" not in entry:
+            _backfill_index_entry(agent_id, entry)
     return data
 
 
-def _save_index(agent_id: str, data: Dict) -> None:
-    path = _index_path(agent_id)
-    with path.open("w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+def _backfill_index_entry(agent_id: str, entry: Dict) -> None:
+    """
+    Starsze indeksy nie mają risk_base/total_rules – uzupełniamy je
+    z pliku raportu w pamięci; na dysk trafią z najbliższym zapisem indeksu
+    (persist_report), żeby odczyt nie nadpisywał równoległego zapisu.
+    """
+    data = _read_report(agent_id, entry["file"])
+    entry.update(_index_stats(data.get("rules", []) if data else []))
 
 
 def _agent_config_path(agent_id: str) -> Path:
     return _agent_dir(agent_id) / "config.json"
 
 
+def latest_report_validator(agent_id: str, with_config: bool = False) -> Optional[str]:
+    """
+    Słaby ETag ostatniego raportu liczony z samego index.json (bez
+    wczytywania raportu): W/"<timestamp>", a z with_config dodatkowo
+    mtime config.json (od niego zależy risk score). None, gdy brak raportów.
+    """
+    reports = _load_index(agent_id).get("reports", [])
+    if not reports:
+        return None
+    tag = reports[-1]["report_timestamp"]
+    if with_config:
+        try:
+            tag += f"-{_agent_config_path(agent_id).stat().st_mtime_ns}"
+        except FileNotFoundError:
+            tag += "-0"
+    return f'W/"{tag}"'
+
+
 def get_agent_config(agent_id: str) -> AgentConfig:
     """
     Zwraca konfigurację agenta.
     Jeśli brak config.json, zwraca domyślną konfigurację.
     """
-    path = _agent_config_path(agent_id)
-    if not path.exists():
+    try:
+        raw = _loads(_agent_config_path(agent_id).read_bytes())
+    except FileNotFoundError:
         return AgentConfig(
             agent_id=agent_id,
             scan_interval_seconds=21600,
             enabled=True,
         )
 
-    with path.open("r", encoding="utf-8") as f:
-        raw = json.load(f)
-
     raw.setdefault("agent_id", agent_id)
     return AgentConfig(**raw)
 
 
+def allocate_timestamp() -> str:
+    """
+    Timestamp raportu (UTC) – używany w nazwie pliku i w indeksie.
+    """
+    return dt.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+
+
 def save_report(report: AgentReportCreate) -> str:
+    """
+    Zapisuje raport agenta i zwraca timestamp użyty w nazwie pliku.
+    """
+    ts = allocate_timestamp()
+    persist_report(report, ts)
+    return ts
+
+
+def persist_report(report: AgentReportCreate, ts: str) -> None:
     """
     Zapisuje raport agenta do pliku:
     server_data/agents/<agent_id>/reports/<timestamp>.json
     oraz aktualizuje index.json.
-    Zwraca timestamp użyty w nazwie pliku.
     """
     agent_id = report.agent_id
-    ts = dt.datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
 
     agent_dir = _agent_dir(agent_id)
     reports_dir = agent_dir / "reports"
+    # Zapis jest rzadki – tu zawsze upewniamy się, że katalog istnieje
+    # (mógł zostać usunięty po wpisaniu do _ensured)
+    reports_dir.mkdir(parents=True, exist_ok=True)
     file_path = reports_dir / f"{ts}.json"
 
+    # Raport został zwalidowany na wejściu – jeden zrzut do dict i dalej
+    # pracujemy na nim, bez ponownego przechodzenia po modelach. Wszystkie
+    # pola są typami JSON, więc wystarcza tryb python (bez konwersji "json");
+    # agent_id mamy już z modelu.
+    dumped = report.model_dump(include={"scan", "rules"})
+    # Severity kanonicznie małymi literami – odczyty wag bez .lower()
+    for r in dumped["rules"]:
+        r["severity"] = r["severity"].lower()
     payload = {
         "agent_id": agent_id,
         "received_at": ts,
-        "scan": report.scan.model_dump(),
-        "rules": [r.model_dump() for r in report.rules],
+        "scan": dumped["scan"],
+        "rules": dumped["rules"],
     }
 
-    with file_path.open("w", encoding="utf-8") as f:
-        json.dump(payload, f, indent=2, ensure_ascii=False)
-
-    # zaktualizuj index
-    index = _load_index(agent_id)
-    failed_count = sum(1 for r in report.rules if not r.passed)
+    file_path.write_bytes(_dumps(payload))
 
     index_entry = {
         "report_timestamp": ts,
         "file": f"reports/{ts}.json",
-        "hostname": report.scan.hostname,
-        "failed_rules_count": failed_count,
+        "hostname": payload["scan"]["hostname"],
+        **_index_stats(payload["rules"]),
     }
 
-    index["reports"].append(index_entry)
-    index["reports"].sort(key=lambda x: x["report_timestamp"])
-    _save_index(agent_id, index)
+    # Timestampy rosną monotonicznie, więc zwykle wystarczy append; zapis
+    # w tle może jednak wyprzedzić starszy raport – wtedy wstawiamy na
+    # właściwe miejsce zamiast sortować cały indeks.
+    with _open_index(agent_id) as index:
+        reports = index.data["reports"]
+        if not reports or reports[-1]["report_timestamp"] <= ts:
+            reports.append(index_entry)
+        else:
+            bisect.insort(reports, index_entry, key=lambda x: x["report_timestamp"])
+        index.dirty = True
+    _invalidate_agent_cache(agent_id)
 
-    return ts
 
+def _read_report(agent_id: str, file_rel: str) -> Optional[Dict]:
+    try:
+        return _loads((AGENTS_DIR / agent_id / file_rel).read_bytes())
+    except FileNotFoundError:
+        return None
 
-def _load_report_file(agent_id: str, file_rel: str) -> Optional[Dict]:
+
+def _load_report_file(agent_id: str, file_rel: str) -> Optional[Mapping[str, Any]]:
+    """
+    Wczytuje raport z dysku. Pliki raportów (nazwane timestampem) się nie
+    zmieniają, więc sparsowany wynik trzymamy w małym LRU kluczowanym
+    mtime – ręczna podmiana pliku i tak wymusi ponowne wczytanie.
+    Zwracany raport jest współdzielony (MappingProxyType – tylko do odczytu).
+    """
+    file_path = _agent_dir(agent_id) / file_rel
+    try:
+        mtime_ns = file_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load_report_cached(agent_id, file_rel, mtime_ns)
+
+
+# Całe raporty (ze wszystkimi wynikami reguł) są duże, a gorące są głównie
+# ostatnie raporty agentów – stąd mały limit; wpisy usuniętych agentów
+# po prostu wypadają z LRU.
+@functools.lru_cache(maxsize=64)
+def _load_report_cached(
+    agent_id: str, file_rel: str, mtime_ns: int
+) -> Optional[Mapping[str, Any]]:
+    data = _read_report(agent_id, file_rel)
+    return MappingProxyType(data) if data is not None else None
+
+
+def _report_rule_status(
+    agent_id: str, file_rel: str
+) -> Optional[Tuple[Optional[str], Mapping[str, bool]]]:
+    """
+    (received_at, rule_id -> passed) raportu – tylko ta pochodna (a nie cały
+    raport) jest trzymana w LRU dla historii, kluczowana jak raport (mtime).
+    """
     file_path = _agent_dir(agent_id) / file_rel
-    if not file_path.exists():
+    try:
+        mtime_ns = file_path.stat().st_mtime_ns
+    except FileNotFoundError:
         return None
-    with file_path.open("r", encoding="utf-8") as f:
-        return json.load(f)
+    return _rule_status_cached(agent_id, file_rel, mtime_ns)
 
 
-def _load_latest_report_raw(agent_id: str) -> Optional[Dict]:
+@functools.lru_cache(maxsize=1024)
+def _rule_status_cached(
+    agent_id: str, file_rel: str, mtime_ns: int
+) -> Optional[Tuple[Optional[str], Mapping[str, bool]]]:
+    data = _read_report(agent_id, file_rel)
+    if not data:
+        return None
+    passed_by_id = {
+        r.get("rule_id"): bool(r.get("passed", False))
+        for r in data.get("rules", []) or []
+    }
+    return data.get("received_at"), MappingProxyType(passed_by_id)
+
+
+# Odczyt wielu raportów z wolnego dysku (NAS/SMB) nakładamy w wątkach;
+# okno ogranicza pracę, gdy konsument kończy wcześniej (reverse walk).
+_PREFETCH_MIN_FILES = 4
+_PREFETCH_WINDOW = 8
+_prefetch_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="nis2-prefetch")
+
+
+def _rule_statuses_newest_first(
+    agent_id: str, files: List[str]
+) -> Iterator[Optional[Tuple[Optional[str], Mapping[str, bool]]]]:
+    """
+    _report_rule_status kolejnych plików (w podanej kolejności), z odczytem
+    do _PREFETCH_WINDOW plików naprzód w puli wątków. Wyniki trafiają do
+    LRU, więc kolejne wywołania nie czytają dysku ponownie.
+    """
+    if len(files) <= _PREFETCH_MIN_FILES:
+        for file_rel in files:
+            yield _report_rule_status(agent_id, file_rel)
+        return
+
+    remaining = iter(files)
+    pending = deque(
+        _prefetch_pool.submit(_report_rule_status, agent_id, file_rel)
+        for file_rel in itertools.islice(remaining, _PREFETCH_WINDOW)
+    )
+    try:
+        while pending:
+            result = pending.popleft().result()
+            file_rel = next(remaining, None)
+            if file_rel is not None:
+                pending.append(_prefetch_pool.submit(_report_rule_status, agent_id, file_rel))
+            yield result
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _load_latest_report_raw(agent_id: str) -> Optional[Mapping[str, Any]]:
     index = _load_index(agent_id)
     reports = index.get("reports", [])
     if not reports:
@@ -132,37 +367,62 @@ def _load_latest_report_raw(agent_id: str) -> Optional[Dict]:
     return _load_report_file(agent_id, last["file"])
 
 
-def _load_all_reports_raw(agent_id: str) -> List[Dict]:
-    index = _load_index(agent_id)
-    reports = index.get("reports", [])
-    out: List[Dict] = []
-    for entry in reports:
-        data = _load_report_file(agent_id, entry["file"])
-        if data:
-            out.append(data)
-    return out
+_SEVERITY_WEIGHTS = {
+    "low": 1.0,
+    "medium": 3.0,
+    "high": 5.0,
+    "critical": 8.0,
+}
+
+_CRITICALITY_FACTORS = {
+    "low": 0.5,
+    "normal": 1.0,
+    "high": 1.5,
+    "critical": 2.0,
+}
 
 
 def _severity_weight(severity: str) -> float:
-    s = severity.lower()
-    mapping = {
-        "low": 1.0,
-        "medium": 3.0,
-        "high": 5.0,
-        "critical": 8.0,
-    }
-    return mapping.get(s, 1.0)
+    # persist_report zapisuje severity małymi literami – .lower() tylko
+    # dla starszych raportów, gdy bezpośrednie trafienie zawiedzie
+    weight = _SEVERITY_WEIGHTS.get(severity)
+    if weight is None:
+        weight = _SEVERITY_WEIGHTS.get(severity.lower(), 1.0)
+    return weight
 
 
 def _criticality_factor(criticality: str) -> float:
-    c = criticality.lower()
-    mapping = {
-        "low": 0.5,
-        "normal": 1.0,
-        "high": 1.5,
-        "critical": 2.0,
+    factor = _CRITICALITY_FACTORS.get(criticality)
+    if factor is None:
+        factor = _CRITICALITY_FACTORS.get(criticality.lower(), 1.0)
+    return factor
+
+
+def _risk_base(rules: List[Dict]) -> float:
+    """
+    Część risk score niezależna od configu agenta: suma wag severity
+    niezaliczonych reguł przemnożonych przez liczbę ich frameworków.
+    """
+    risk = 0.0
+    for r in rules:
+        if r.get("passed", False):
+            continue
+        risk += _severity_weight(str(r.get("severity", "low"))) * max(
+            1, len(r.get("frameworks") or [])
+        )
+    return risk
+
+
+def _index_stats(rules: List[Dict]) -> Dict:
+    """
+    Pola wpisu index.json liczone raz przy zapisie raportu, żeby listy
+    i historia nie musiały otwierać plików raportów.
+    """
+    return {
+        "failed_rules_count": sum(1 for r in rules if not r.get("passed", False)),
+        "total_rules": len(rules),
+        "risk_base": _risk_base(rules),
     }
-    return mapping.get(c, 1.0)
 
 
 def compute_risk_for_report(report_dict: Dict, cfg: Optional[AgentConfig]) -> float:
@@ -177,72 +437,88 @@ def compute_risk_for_report(report_dict: Dict, cfg: Optional[AgentConfig]) -> fl
 
     rules = report_dict.get("rules", []) or []
     crit_factor = _criticality_factor(cfg.criticality if cfg else "normal")
+    return _risk_base(rules) * crit_factor
 
-    risk = 0.0
-    for r in rules:
-        if r.get("passed", False):
-            continue
-        sev = str(r.get("severity", "low"))
-        sev_w = _severity_weight(sev)
-        frameworks = r.get("frameworks") or []
-        fw_factor = max(1, len(frameworks))
-        risk += sev_w * fw_factor * crit_factor
 
-    return risk
+def _entry_risk(entry: Dict, cfg: Optional[AgentConfig]) -> float:
+    # Krytyczność może się zmienić po zapisie raportu, więc mnożymy dopiero tu
+    crit_factor = _criticality_factor(cfg.criticality if cfg else "normal")
+    return entry.get("risk_base", 0.0) * crit_factor
 
 
 def list_agents() -> List[AgentSummary]:
-    if not AGENTS_DIR.exists():
+    cached = _agents_cache.get("all")
+    if cached is not None:
+        return cached
+    summaries = _list_agents_uncached()
+    _agents_cache.set("all", summaries)
+    return summaries
+
+
+def _agent_ids() -> List[str]:
+    """
+    Posortowane identyfikatory agentów (podkatalogi AGENTS_DIR). Katalog
+    agenta będący symlinkiem też się liczy – tak jak dawniej przy iterdir –
+    i ta sama reguła obowiązuje we wszystkich listach agentów.
+    """
+    try:
+        with os.scandir(AGENTS_DIR) as it:
+            return sorted(entry.name for entry in it if entry.is_dir())
+    except FileNotFoundError:
         return []
 
-    summaries: List[AgentSummary] = []
 
-    for entry in sorted(AGENTS_DIR.iterdir()):
-        if not entry.is_dir():
-            continue
-        agent_id = entry.name
-        index = _load_index(agent_id)
-        reports = index.get("reports", [])
-        if not reports:
-            summaries.append(
-                AgentSummary(
-                    agent_id=agent_id,
-                    last_report_at=None,
-                    failed_rules_count=0,
-                    risk_score=0.0,
-                )
-            )
-            continue
+def _list_agents_uncached() -> List[AgentSummary]:
+    return [get_agent_summary(agent_id) for agent_id in _agent_ids()]
 
-        last = reports[-1]
-        last_raw = _load_report_file(agent_id, last["file"])
-        cfg = get_agent_config(agent_id)
-        risk = compute_risk_for_report(last_raw, cfg) if last_raw else 0.0
-
-        summaries.append(
-            AgentSummary(
-                agent_id=agent_id,
-                last_report_at=last.get("report_timestamp"),
-                failed_rules_count=last.get("failed_rules_count", 0),
-                risk_score=risk,
-            )
+
+def get_agent_summary(agent_id: str) -> AgentSummary:
+    """
+    Podsumowanie jednego agenta (ostatni raport + risk score).
+    """
+    index = _load_index(agent_id)
+    reports = index.get("reports", [])
+    if not reports:
+        return AgentSummary.model_construct(
+            agent_id=agent_id,
+            last_report_at=None,
+            failed_rules_count=0,
+            risk_score=0.0,
         )
 
-    return summaries
+    last = reports[-1]
+    risk = _entry_risk(last, get_agent_config(agent_id))
+
+    return AgentSummary.model_construct(
+        agent_id=agent_id,
+        last_report_at=last.get("report_timestamp"),
+        failed_rules_count=last.get("failed_rules_count", 0),
+        risk_score=risk,
+    )
 
 
 def get_latest_report_summary(agent_id: str) -> Optional[ReportSummary]:
+    cached = _latest_cache.get(agent_id, _MISSING)
+    if cached is not _MISSING:
+        return cached
+    summary = _latest_report_summary_uncached(agent_id)
+    _latest_cache.set(agent_id, summary)
+    return summary
+
+
+def _latest_report_summary_uncached(agent_id: str) -> Optional[ReportSummary]:
     data = _load_latest_report_raw(agent_id)
     if not data:
         return None
 
+    # Dane z dysku zapisał persist_report po walidacji – bez ponownej walidacji
     failed_rules = [
-        RuleResultModel(**r)
+        RuleResultModel.model_construct(**r)
         for r in data.get("rules", [])
         if not r.get("passed", False)
     ]
 
-    return ReportSummary(
+    return ReportSummary.model_construct(
         agent_id=data["agent_id"],
         report_timestamp=data["received_at"],
         hostname=data["scan"].get("hostname", ""),
@@ -250,6 +526,40 @@ def get_latest_report_summary(agent_id: str) -> Optional[ReportSummary]:
     )
 
 
+def batch_latest_summaries() -> Dict[str, ReportSummary]:
+    """
+    Ostatnie raporty wszystkich agentów w jednym przejściu po katalogu
+    (agenci bez raportów są pomijani).
+    """
+    out: Dict[str, ReportSummary] = {}
+    for agent_id in _agent_ids():
+        summary = get_latest_report_summary(agent_id)
+        if summary:
+            out[agent_id] = summary
+    return out
+
+
+def list_agents_with_latest() -> List[AgentSummaryWithLatest]:
+    """
+    Lista agentów z dołączonym ostatnim raportem – jedno przejście po
+    katalogu agentów zamiast osobnego /latest dla każdego z nich.
+    """
+    latest = batch_latest_summaries()
+    return [
+        AgentSummaryWithLatest.model_construct(
+            **dict(agent), latest=latest.get(agent.agent_id)
+        )
+        for agent in list_agents()
+    ]
+
+
+def get_dashboard_data() -> DashboardData:
+    return DashboardData.model_construct(
+        agents=list_agents(),
+        latest_by_agent=batch_latest_summaries(),
+    )
+
+
 def compute_time_to_fix_meta(agent_id: str) -> Dict[str, RuleTimeMeta]:
     """
     Na podstawie historii raportów danego agenta liczy:
@@ -259,55 +569,51 @@ def compute_time_to_fix_meta(agent_id: str) -> Dict[str, RuleTimeMeta]:
     Zwraca mapę rule_id -> RuleTimeMeta dla reguł, które
     są niespełnione w NAJNOWSZYM raporcie.
     """
-    all_reports = _load_all_reports_raw(agent_id)
-    if not all_reports:
-        return {}
-
-    last_status: Dict[str, bool] = {}
-    failing_since_ts: Dict[str, str] = {}
-    failing_scans_count: Dict[str, int] = {}
-
-    for data in all_reports:
-        ts = data.get("received_at")
-        rules = data.get("rules", []) or []
+    # Od najnowszego raportu wstecz: streak reguły kończy się na pierwszym
+    # starszym raporcie, w którym przechodzi. Raporty bez danej reguły są
+    # pomijane (nie przerywają ani nie wydłużają serii). Starsze pliki
+    # czytamy tylko, dopóki któraś reguła wciąż ma otwarty streak.
+    entries = _load_index(agent_id)["reports"]
+    reports = (
+        status
+        for status in _rule_statuses_newest_first(
+            agent_id, [entry["file"] for entry in reversed(entries)]
+        )
+        if status
+    )
 
-        for r in rules:
-            rid = r.get("rule_id")
-            passed = bool(r.get("passed", False))
-            prev = last_status.get(rid)
+    latest = next(reports, None)
+    if latest is None:
+        return {}
 
-            if prev is None:
-                if not passed:
-                    failing_since_ts[rid] = ts
-                    failing_scans_count[rid] = 1
+    latest_ts, latest_passed = latest
+    failing_since_ts: Dict[str, str] = {
+        rid: latest_ts for rid, passed in latest_passed.items() if not passed
+    }
+    failing_scans_count: Dict[str, int] = dict.fromkeys(failing_since_ts, 1)
+
+    open_streaks = set(failing_since_ts)
+    for ts, passed_by_id in reports:
+        if not open_streaks:
+            break
+        for rid in list(open_streaks):
+            passed = passed_by_id.get(rid)
+            if passed is None:
+                continue
+            if passed:
+                open_streaks.discard(rid)
             else:
-                if not passed:
-                    if prev:
-                        failing_since_ts[rid] = ts
-                        failing_scans_count[rid] = 1
-                    else:
-                        failing_scans_count[rid] = failing_scans_count.get(rid, 0) + 1
-                else:
-                    failing_since_ts.pop(rid, None)
-                    failing_scans_count.pop(rid, None)
-
-            last_status[rid] = passed
-
-    latest = all_reports[-1]
-    latest_ts = latest.get("received_at")
-    meta: Dict[str, RuleTimeMeta] = {}
-
-    for r in latest.get("rules", []) or []:
-        rid = r.get("rule_id")
-        if r.get("passed", False):
-            continue
-        since = failing_since_ts.get(rid, latest_ts)
-        scans = failing_scans_count.get(rid, 1)
-        meta[rid] = RuleTimeMeta(
+                failing_since_ts[rid] = ts
+                failing_scans_count[rid] += 1
+
+    meta: Dict[str, RuleTimeMeta] = {
+        rid: RuleTimeMeta.model_construct(
             rule_id=rid,
             failing_since_report_timestamp=since,
-            failing_scans=scans,
+            failing_scans=failing_scans_count[rid],
         )
+        for rid, since in failing_since_ts.items()
+    }
 
     return meta
 
@@ -317,13 +623,12 @@ def get_latest_report_summary_enriched(agent_id: str) -> Optional[ReportSummaryE
     if not base:
         return None
 
-    raw = _load_latest_report_raw(agent_id)
-    cfg = get_agent_config(agent_id)
-    risk = compute_risk_for_report(raw, cfg) if raw else 0.0
+    reports = _load_index(agent_id)["reports"]
+    risk = _entry_risk(reports[-1], get_agent_config(agent_id)) if reports else 0.0
     meta_map = compute_time_to_fix_meta(agent_id)
     meta_list = list(meta_map.values())
 
-    return ReportSummaryEnriched(
+    return ReportSummaryEnriched.model_construct(
         agent_id=base.agent_id,
         report_timestamp=base.report_timestamp,
         hostname=base.hostname,
@@ -334,7 +639,8 @@ def get_latest_report_summary_enriched(agent_id: str) -> Optional[ReportSummaryE
 
 
 def get_latest_raw_report(agent_id: str) -> Optional[Dict]:
-    return _load_latest_report_raw(agent_id)
+    data = _load_latest_report_raw(agent_id)
+    return dict(data) if data is not None else None
 
 
 def get_report_history(agent_id: str, limit: int = 20) -> List[ReportHistoryPoint]:
@@ -354,21 +660,13 @@ def get_report_history(agent_id: str, limit: int = 20) -> List[ReportHistoryPoin
     cfg = get_agent_config(agent_id)
 
     for entry in selected:
-        data = _load_report_file(agent_id, entry["file"])
-        if not data:
-            continue
-        rules = data.get("rules", []) or []
-        total_rules = len(rules)
-        failed_rules = sum(1 for r in rules if not r.get("passed", False))
-        risk = compute_risk_for_report(data, cfg)
-
         history.append(
-            ReportHistoryPoint(
-                report_timestamp=data.get("received_at", entry["report_timestamp"]),
-                hostname=data.get("scan", {}).get("hostname", ""),
-                total_rules=total_rules,
-                failed_rules=failed_rules,
-                risk_score=risk,
+            ReportHistoryPoint.model_construct(
+                report_timestamp=entry["report_timestamp"],
+                hostname=entry.get("hostname", ""),
+                total_rules=entry.get("total_rules", 0),
+                failed_rules=entry.get("failed_rules_count", 0),
+                risk_score=_entry_risk(entry, cfg),
             )
         )
 
@@ -381,37 +679,50 @@ def get_what_if(agent_id: str, framework: str) -> WhatIfResult:
     zwraca status wszystkich reguł oznaczonych tym frameworkiem:
     - passed / failed / not_implemented
     """
-    rules = load_rules_catalog()
-    fw_index = get_framework_index(rules)
-    fw_rules = fw_index.get(framework, [])
+    fw_index = get_framework_index(load_rules_catalog())
+    return _build_what_if(
+        agent_id,
+        framework,
+        fw_index.get(framework, []),
+        _latest_rule_status(agent_id),
+    )
 
-    data = _load_latest_report_raw(agent_id)
-    if not data:
-        return WhatIfResult(
-            agent_id=agent_id,
-            framework=framework,
-            total_rules=len(fw_rules),
-            passed=0,
-            failed=0,
-            not_implemented=len(fw_rules),
-            rules=[
-                WhatIfRuleStatus(
-                    id=r.id,
-                    description=r.description,
-                    severity=r.severity,
-                    frameworks=r.frameworks,
-                    status="not_implemented",
-                )
-                for r in fw_rules
-            ],
+
+def get_what_if_all(agent_id: str) -> Dict[str, WhatIfResult]:
+    """
+    What-if dla wszystkich frameworków z katalogu naraz – ostatni raport
+    agenta wczytywany jest raz, nie osobno dla każdego frameworka.
+    """
+    fw_index = get_framework_index(load_rules_catalog())
+    rule_status_map = _latest_rule_status(agent_id)
+    return {
+        framework: _build_what_if(
+            agent_id, framework, fw_index[framework], rule_status_map
         )
+        for framework in sorted(fw_index)
+    }
+
+
+def _latest_rule_status(agent_id: str) -> Dict[str, str]:
+    """
+    rule_id -> "passed" / "failed" z ostatniego raportu (pusta mapa, gdy
+    agent nie ma raportów – wtedy wszystko wychodzi jako not_implemented).
+    """
+    reports = _load_index(agent_id)["reports"]
+    status = _report_rule_status(agent_id, reports[-1]["file"]) if reports else None
+    if not status:
+        return {}
+    return {
+        rid: "passed" if passed else "failed" for rid, passed in status[1].items()
+    }
 
-    rule_status_map: Dict[str, str] = {}
-    for r in data.get("rules", []) or []:
-        rid = r.get("rule_id")
-        status = "passed" if r.get("passed", False) else "failed"
-        rule_status_map[rid] = status
 
+def _build_what_if(
+    agent_id: str,
+    framework: str,
+    fw_rules: List[RuleDefinition],
+    rule_status_map: Dict[str, str],
+) -> WhatIfResult:
     out_rules: List[WhatIfRuleStatus] = []
     passed = failed = not_impl = 0
 
@@ -425,7 +736,7 @@ def get_what_if(agent_id: str, framework: str) -> WhatIfResult:
             not_impl += 1
 
         out_rules.append(
-            WhatIfRuleStatus(
+            WhatIfRuleStatus.model_construct(
                 id=r.id,
                 description=r.description,
                 severity=r.severity,
@@ -434,7 +745,7 @@ def get_what_if(agent_id: str, framework: str) -> WhatIfResult:
             )
         )
 
-    return WhatIfResult(
+    return WhatIfResult.model_construct(
         agent_id=agent_id,
         framework=framework,
         total_rules=len(fw_rules),
@@ -442,4 +753,4 @@ def get_what_if(agent_id: str, framework: str) -> WhatIfResult:
         failed=failed,
         not_implemented=not_impl,
         rules=out_rules,
-    )
\ No newline at end of file
+    )
@@ -1,47 +1,122 @@
 import yara
 from pathlib import Path
+import json
+import logging
 import os
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def _iter_files(directory):
+    # os.scandir zwraca DirEntry z typem wpisu – bez osobnego stat na plik.
+    # Symlinków do katalogów nie odwiedzamy (pętle), ale pliki pod symlinkami
+    # skanujemy jak wcześniej przy os.walk.
+    try:
+        with os.scandir(directory) as it:
+            entries = list(it)
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                yield from _iter_files(entry.path)
+            elif entry.is_file():
+                yield entry.path
+        except OSError:
+            continue
+
+
+COMPILED_RULES = "./yara_rules/compiled_rules.yarc"
+COMPILED_RULES_META = COMPILED_RULES + ".meta"
+
 
 class YaraScanner:
-    _user_path = str(Path.home().home())
-    popular_directories = [_user_path+"\\Downloads",_user_path+"\\Documents",_user_path+"\\Desktop",_user_path+"\\AppData\\Local\\Temp"]
+    _user_path = Path.home()
+    popular_directories = [_user_path / "Downloads", _user_path / "Documents", _user_path / "Desktop", _user_path / "AppData" / "Local" / "Temp"]
     def __init__(self, rules_dir="./yara_rules/misc"):
         self.rules_dir = Path(rules_dir)
         self.rule_files = sorted(list(self.rules_dir.rglob("*.yar")) + list(self.rules_dir.rglob("*.yara")))
         self.filepaths = {f"namespace{i}" : str(p) for i,p in enumerate(self.rule_files)}
         self.rules = self.compile_rules()
+    def _sources_signature(self) -> str:
+        # (ścieżka, mtime_ns, rozmiar) każdego źródła – wykrywa też dodanie/usunięcie pliku
+        signature = []
+        for p in self.rule_files:
+            st = p.stat()
+            signature.append([str(p), st.st_mtime_ns, st.st_size])
+        return json.dumps(signature)
+
     def compile_rules(self) -> yara.Rules:
         rules = None
         try:
+            signature = self._sources_signature()
+            # Skompilowany blob jest aktualny, jeśli sidecar ma tę samą sygnaturę źródeł
+            if os.path.exists(COMPILED_RULES) and os.path.exists(COMPILED_RULES_META):
+                with open(COMPILED_RULES_META, encoding="utf-8") as f:
+                    if f.read() == signature:
+                        try:
+                            return yara.load(COMPILED_RULES)
+                        except yara.Error as e:
+                            logger.warning("Recompiling, cannot load %s: %s", COMPILED_RULES, e)
             rules = yara.compile(filepaths=self.filepaths)
-            rules.save("./yara_rules/compiled_rules.yarc")
+            rules.save(COMPILED_RULES)
+            with open(COMPILED_RULES_META, "w", encoding="utf-8") as f:
+                f.write(signature)
         except Exception as e:
-            print(f"YaraScanner Exception: \n{e}")
+            logger.error("YaraScanner exception: %s", e)
         return rules
 
-    def malware_fast_scan(self,directories=popular_directories,fast=True,timeout=5) -> list[str]:
+    def _match(self, f_path, fast, timeout):
+        return self.rules.match(filepath=f_path,externals={"filepath":f_path},fast=fast,timeout=timeout)
+
+    def malware_fast_scan(self,directories=popular_directories,fast=True,timeout=5,max_workers=None) -> list[str]:
+        # libyara zwalnia GIL w match(), więc pliki skanujemy równolegle w wątkach;
+        # kolejka w locie jest ograniczona, a wyniki zbieramy w kolejności plików
+        if self.rules is None:
+            # Bez skompilowanych reguł każdy match by się wywalił, a skan
+            # wyglądałby na czysty – lepiej zgłosić błąd od razu
+            logger.error("YARA rules are not loaded, scan aborted")
+            return []
+
+        workers = max_workers or min(32, (os.cpu_count() or 1) * 4)
         result = []
-        print(f"Scan started: {time.ctime(time.time())}")
-        for d in directories:
-            for root, dirs, files in os.walk(d):
-                for file in files:
-                    try:
-                        f_path = root+"\\"+file
-                        matches = self.rules.match(filepath=f_path,externals={"filepath":f_path},fast=fast,timeout=timeout)
-                        #print(f"Scanning: {f_path}")
-                        if matches:
-                            print(f"[!] File matched yara rule: {f_path}")
-                            result.append(f_path)
-                    except Exception as e:
-                        print(e)
-        print(f"Scan finished: {time.ctime(time.time())}")
-        print("Detected files:")
-        [print(x) for x in result]
+        errors = 0
+        in_flight = deque()
+
+        def collect(f_path, future):
+            # Trafienia tylko zbieramy; wypisujemy je zbiorczo po skanie
+            nonlocal errors
+            try:
+                if future.result():
+                    result.append(f_path)
+            except Exception as e:
+                errors += 1
+                logger.warning("Cannot scan %s: %s", f_path, e)
+
+        logger.info("Scan started: %s", time.ctime(time.time()))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for d in directories:
+                for f_path in _iter_files(d):
+                    in_flight.append((f_path, executor.submit(self._match, f_path, fast, timeout)))
+                    if len(in_flight) >= 2 * workers:
+                        collect(*in_flight.popleft())
+            while in_flight:
+                collect(*in_flight.popleft())
+        logger.info("Scan finished: %s", time.ctime(time.time()))
+        logger.info(
+            "Detected files (%d), scan errors (%d):%s",
+            len(result),
+            errors,
+            "".join("\n[!] " + x for x in result),
+        )
         return result
     def malware_full_scan(self) -> list[str]:
         self.malware_fast_scan(directories=["C:\\"],timeout=15)
 
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     sc = YaraScanner()
     sc.malware_fast_scan()
\ No newline at end of file